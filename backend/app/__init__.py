@@ -0,0 +1,13 @@
+import os
+
+from dotenv import load_dotenv
+
+# Loaded once, before any app module reads its configuration from the environment
+load_dotenv()
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
@@ -0,0 +1,111 @@
+import math
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Optional, Tuple
+
+from app import env_flag, metrics
+
+# Output limits follow what each endpoint and language actually needs instead of one global cap
+ADAPTIVE = env_flag("OUTPUT_BUDGET_ADAPTIVE", True)
+PERCENTILE = float(os.getenv("OUTPUT_BUDGET_PERCENTILE", "0.99"))
+HEADROOM = float(os.getenv("OUTPUT_BUDGET_HEADROOM", "1.5"))
+MIN_SAMPLES = int(os.getenv("OUTPUT_BUDGET_MIN_SAMPLES", "20"))
+WINDOW = int(os.getenv("OUTPUT_BUDGET_WINDOW", "512"))
+FLOOR_TOKENS = int(os.getenv("OUTPUT_BUDGET_FLOOR_TOKENS", "128"))
+# Per item; also bounds the one retry made after a truncated answer
+CEILING_TOKENS = int(os.getenv("OUTPUT_BUDGET_CEILING_TOKENS", "2048"))
+
+
+class CallKind(NamedTuple):
+    endpoint: str
+    language: str
+    # Batched prompts answer several items; budgets are learned and granted per item
+    items: int = 1
+
+
+class OutputBudget:
+    def __init__(self, size: int = WINDOW) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, tokens: float) -> None:
+        with self._lock:
+            self._samples.append(tokens)
+
+    def limit(self, default: int) -> int:
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ADAPTIVE or len(ordered) < MIN_SAMPLES:
+            return default
+        index = min(len(ordered) - 1, max(0, math.ceil(PERCENTILE * len(ordered)) - 1))
+        return max(FLOOR_TOKENS, min(CEILING_TOKENS, math.ceil(ordered[index] * HEADROOM)))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+
+_budgets: Dict[Tuple[str, str], OutputBudget] = {}
+_registry_lock = threading.Lock()
+
+
+def get_budget(kind: CallKind) -> OutputBudget:
+    with _registry_lock:
+        budget = _budgets.get((kind.endpoint, kind.language))
+        if budget is None:
+            budget = OutputBudget()
+            _budgets[(kind.endpoint, kind.language)] = budget
+        return budget
+
+
+def output_limit(kind: CallKind, default: int) -> int:
+    return get_budget(kind).limit(default) * kind.items
+
+
+def expanded_limit(kind: CallKind, limit: int) -> Optional[int]:
+    larger = min(limit * 2, CEILING_TOKENS * kind.items)
+    return larger if larger > limit else None
+
+
+def output_tokens(response: Any) -> Optional[int]:
+    # Thinking tokens count against max_output_tokens just like the visible answer
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    counts = [getattr(usage, name, None) for name in ("candidates_token_count", "thoughts_token_count")]
+    total = sum(count for count in counts if isinstance(count, int))
+    return total or None
+
+
+def is_truncated(response: Any) -> bool:
+    for candidate in getattr(response, "candidates", None) or []:
+        reason = getattr(candidate, "finish_reason", None)
+        if str(getattr(reason, "value", reason)) == "MAX_TOKENS":
+            return True
+    return False
+
+
+def observe(kind: CallKind, model: str, response: Any) -> None:
+    metrics.record_usage(model, response, kind.endpoint, kind.language)
+    if is_truncated(response):
+        # A cut-off answer only shows the limit, not the need; the retry's usage is recorded instead
+        metrics.TRUNCATIONS.inc(endpoint=kind.endpoint, model=model, language=kind.language)
+        return
+    tokens = output_tokens(response)
+    if tokens:
+        get_budget(kind).observe(tokens / kind.items)
+
+
+def budget_stats(default: int) -> Dict[str, Dict[str, int]]:
+    with _registry_lock:
+        budgets = list(_budgets.items())
+    return {
+        f"{endpoint}/{language}": {"samples": len(budget), "limit": budget.limit(default)}
+        for (endpoint, language), budget in budgets
+    }
+
+
+def reset_budgets() -> None:
+    with _registry_lock:
+        _budgets.clear()
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+from app.normalize import canonicalize
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory").strip().lower()
+CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite3")
+CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+SQLITE_MMAP_BYTES = int(os.getenv("RESULT_CACHE_MMAP_BYTES", str(64 * 1024 * 1024)))
+# SQLite recency is approximate: a hit refreshes accessed_at at most this often, so hot reads stay read-only
+SQLITE_TOUCH_SECONDS = float(os.getenv("RESULT_CACHE_TOUCH_SECONDS", "300"))
+
+
+def normalize_key_text(text: str) -> str:
+    return canonicalize(text)
+
+
+def make_key(text: str, language: str, model_chain: Any) -> str:
+    # Model chain is part of the key so reordering models never serves stale output
+    return f"{language}|{','.join(model_chain)}|{normalize_key_text(text)}"
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class CachedResult:
+    # Read-only result encoded once at store time; hits are served as-is without copying
+    __slots__ = ("data", "body", "etag")
+
+    def __init__(self, data: Any, body: bytes) -> None:
+        self.data = data
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    @classmethod
+    def of(cls, value: Union["CachedResult", Mapping]) -> "CachedResult":
+        if isinstance(value, CachedResult):
+            return value
+        body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return cls(_freeze(value), body)
+
+    @classmethod
+    def from_json(cls, raw: Union[str, bytes]) -> "CachedResult":
+        body = raw.encode("utf-8") if isinstance(raw, str) else raw
+        return cls(_freeze(json.loads(body)), body)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _thaw(self.data)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CachedResult):
+            return self.body == other.body
+        if isinstance(other, Mapping):
+            return self.to_dict() == _thaw(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.body)
+
+    def __repr__(self) -> str:
+        return f"CachedResult({self.body.decode('utf-8')})"
+
+
+CacheValue = Union[CachedResult, Mapping]
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.skipped = 0
+
+    def incr(self, field: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "skipped": self.skipped,
+            }
+
+
+class CacheBackend:
+    def __init__(self, namespace: str, maxsize: int, ttl: float) -> None:
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: CacheValue, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[str, CachedResult, Optional[float]]]:
+        # Live (key, value, expires_at) entries, least recently used first
+        raise NotImplementedError
+
+    def contains(self, key: str) -> bool:
+        # Presence check that leaves hit/miss stats and recency untouched
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def _expires_at(self, ttl: Optional[float] = None) -> Optional[float]:
+        ttl = self.ttl if ttl is None else ttl
+        return time.time() + ttl if ttl > 0 else None
+
+
+class MemoryCache(CacheBackend):
+    def __init__(self, namespace: str, maxsize: int, ttl: float = CACHE_TTL_SECONDS) -> None:
+        super().__init__(namespace, maxsize, ttl)
+        self._data: "OrderedDict[str, Tuple[Optional[float], CachedResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.incr("misses")
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.stats.incr("expirations")
+                self.stats.incr("misses")
+                return None
+            self._data.move_to_end(key)
+            self.stats.incr("hits")
+            return value
+
+    def set(self, key: str, value: CacheValue, ttl: Optional[float] = None) -> None:
+        entry = CachedResult.of(value)
+        with self._lock:
+            self._data[key] = (self._expires_at(ttl), entry)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.incr("evictions")
+
+    def items(self) -> Iterator[Tuple[str, CachedResult, Optional[float]]]:
+        with self._lock:
+            entries = list(self._data.items())
+        now = time.time()
+        for key, (expires_at, value) in entries:
+            if expires_at is None or expires_at > now:
+                yield key, value, expires_at
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+        return entry is not None and (entry[0] is None or entry[0] > time.time())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteCache(CacheBackend):
+    # One file shared by every uvicorn worker; WAL + mmap keeps reads cheap across processes
+    def __init__(self, namespace: str, maxsize: int, ttl: float = CACHE_TTL_SECONDS, path: str = CACHE_PATH) -> None:
+        super().__init__(namespace, maxsize, ttl)
+        if not namespace.isidentifier():
+            raise ValueError(f"Invalid cache namespace: {namespace!r}")
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {namespace} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {namespace}_accessed ON {namespace} (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        # Reads never take the single SQLite write lock, except for an occasional recency touch;
+        # expired rows are left for the next set() to purge
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            f"SELECT value, expires_at, accessed_at FROM {self.namespace} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.stats.incr("misses")
+            return None
+        raw, expires_at, accessed_at = row
+        if expires_at is not None and expires_at <= now:
+            self.stats.incr("expirations")
+            self.stats.incr("misses")
+            return None
+        if now - accessed_at >= SQLITE_TOUCH_SECONDS:
+            with conn:
+                conn.execute(f"UPDATE {self.namespace} SET accessed_at = ? WHERE key = ?", (now, key))
+        self.stats.incr("hits")
+        return CachedResult.from_json(raw)
+
+    def set(self, key: str, value: CacheValue, ttl: Optional[float] = None) -> None:
+        raw = CachedResult.of(value).body.decode("utf-8")
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.namespace} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, raw, self._expires_at(ttl), time.time()),
+            )
+            conn.execute(f"DELETE FROM {self.namespace} WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+            (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.namespace}").fetchone()
+            overflow = count - self.maxsize
+            if overflow > 0:
+                cursor = conn.execute(
+                    f"DELETE FROM {self.namespace} WHERE key IN "
+                    f"(SELECT key FROM {self.namespace} ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.stats.incr("evictions", cursor.rowcount)
+
+    def items(self) -> Iterator[Tuple[str, CachedResult, Optional[float]]]:
+        # A dedicated cursor streams rows, so large caches are never loaded at once
+        cursor = self._connect().execute(
+            f"SELECT key, value, expires_at FROM {self.namespace} "
+            "WHERE expires_at IS NULL OR expires_at > ? ORDER BY accessed_at",
+            (time.time(),),
+        )
+        try:
+            for key, raw, expires_at in cursor:
+                yield key, CachedResult.from_json(raw), expires_at
+        finally:
+            cursor.close()
+
+    def contains(self, key: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT 1 FROM {self.namespace} WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return row is not None
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.namespace}")
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.namespace}").fetchone()
+        return count
+
+
+def build_cache(namespace: str, maxsize: int) -> CacheBackend:
+    if CACHE_BACKEND == "sqlite":
+        try:
+            return SQLiteCache(namespace, maxsize)
+        except sqlite3.Error as exc:
+            logger.warning("SQLite cache unavailable at %s (%s); using in-memory cache", CACHE_PATH, exc)
+    elif CACHE_BACKEND != "memory":
+        logger.warning("Unknown RESULT_CACHE_BACKEND %r; using in-memory cache", CACHE_BACKEND)
+    return MemoryCache(namespace, maxsize)
@@ -0,0 +1,179 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+MIN_REQUESTS = int(os.getenv("CIRCUIT_MIN_REQUESTS", "5"))
+ERROR_THRESHOLD = float(os.getenv("CIRCUIT_ERROR_THRESHOLD", "0.5"))
+COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "30"))
+# Models averaging slower than this are tried after faster healthy ones; 0 disables
+SLOW_THRESHOLD_SECONDS = float(os.getenv("CIRCUIT_SLOW_THRESHOLD_MS", "0")) / 1000.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProbeInFlight(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = WINDOW_SECONDS,
+        min_requests: int = MIN_REQUESTS,
+        error_threshold: float = ERROR_THRESHOLD,
+        cooldown_seconds: float = COOLDOWN_SECONDS,
+        slow_threshold_seconds: float = SLOW_THRESHOLD_SECONDS,
+    ) -> None:
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.slow_threshold_seconds = slow_threshold_seconds
+        self._lock = threading.Lock()
+        self._window: Deque[Tuple[float, bool, float]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.cooldown_seconds:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def _trim(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            self._window.popleft()
+
+    def available(self) -> bool:
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            return state == HALF_OPEN and not self._probing
+
+    def try_begin(self) -> bool:
+        # A half-open breaker lets exactly one probe through until it reports back; checking and
+        # claiming the slot under one lock keeps concurrent callers from all probing at once
+        with self._lock:
+            if self._current_state(time.monotonic()) != HALF_OPEN:
+                return True
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def abandon(self) -> None:
+        # A probe that was cancelled or ran out of request time frees the slot without a verdict
+        with self._lock:
+            self._probing = False
+
+    def record_success(self, latency: float) -> None:
+        self._record(True, latency)
+
+    def record_failure(self, latency: float) -> None:
+        self._record(False, latency)
+
+    def _record(self, ok: bool, latency: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                self._probing = False
+                if ok:
+                    logger.info("Circuit for %s closed after successful probe", self.name)
+                    self._state = CLOSED
+                    self._window.clear()
+                else:
+                    self._open(now)
+                    return
+            self._window.append((now, ok, latency))
+            self._trim(now)
+            if self._state == CLOSED and len(self._window) >= self.min_requests:
+                failures = sum(1 for _, success, _ in self._window if not success)
+                if failures / len(self._window) >= self.error_threshold:
+                    self._open(now)
+
+    def _open(self, now: float) -> None:
+        logger.warning("Circuit for %s opened; skipping model for %.0fs", self.name, self.cooldown_seconds)
+        self._state = OPEN
+        self._opened_at = now
+        self._window.clear()
+
+    def error_rate(self) -> float:
+        with self._lock:
+            self._trim(time.monotonic())
+            if not self._window:
+                return 0.0
+            return sum(1 for _, ok, _ in self._window if not ok) / len(self._window)
+
+    def mean_latency(self) -> float:
+        with self._lock:
+            self._trim(time.monotonic())
+            if not self._window:
+                return 0.0
+            return sum(latency for _, _, latency in self._window) / len(self._window)
+
+    def is_slow(self) -> bool:
+        return self.slow_threshold_seconds > 0 and self.mean_latency() >= self.slow_threshold_seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 4),
+            "mean_latency_ms": round(self.mean_latency() * 1000.0, 1),
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _registry_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(model)
+            _breakers[model] = breaker
+        return breaker
+
+
+def route_models(chain: List[str]) -> List[str]:
+    # Healthy models keep their configured priority, slow ones and half-open probes go last,
+    # open circuits are skipped. If every circuit is open we fail open to the configured chain.
+    ranked = []
+    for index, model in enumerate(chain):
+        breaker = get_breaker(model)
+        if not breaker.available():
+            continue
+        demoted = breaker.state != CLOSED or breaker.is_slow()
+        ranked.append((demoted, index, model))
+    if not ranked:
+        return list(chain)
+    return [model for _, _, model in sorted(ranked)]
+
+
+def circuit_stats() -> Dict[str, Dict[str, float]]:
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def reset_breakers() -> None:
+    with _registry_lock:
+        _breakers.clear()
@@ -0,0 +1,70 @@
+import contextlib
+import contextvars
+import os
+import time
+from typing import Iterator, Optional
+
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_MS", "20000")) / 1000.0
+MAX_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_MAX_MS", "60000")) / 1000.0
+HEADER = "x-request-deadline-ms"
+# Calls with less time than this left are not started; the answer could not arrive in time
+MIN_CALL_SECONDS = float(os.getenv("REQUEST_DEADLINE_MIN_CALL_MS", "250")) / 1000.0
+
+# Absolute time.monotonic() by which the current request must answer; None means unbounded
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def parse_header(raw: Optional[str]) -> float:
+    # Clients may shorten or extend the default, but never past the server maximum
+    if raw:
+        try:
+            requested = float(raw) / 1000.0
+        except ValueError:
+            requested = 0.0
+        if requested > 0:
+            return min(requested, MAX_DEADLINE_SECONDS) if MAX_DEADLINE_SECONDS > 0 else requested
+    return DEFAULT_DEADLINE_SECONDS
+
+
+@contextlib.contextmanager
+def use_deadline(seconds: Optional[float]) -> Iterator[None]:
+    # Nested scopes can only tighten the deadline; 0 or None adds no limit
+    current = request_deadline.get()
+    deadline = time.monotonic() + seconds if seconds and seconds > 0 else None
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = request_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+def shared_deadline() -> Optional[float]:
+    # Work several requests wait on answers to the server's bound, never to one client's header
+    bound = MAX_DEADLINE_SECONDS if MAX_DEADLINE_SECONDS > 0 else DEFAULT_DEADLINE_SECONDS
+    return time.monotonic() + bound if bound > 0 else None
+
+
+def remaining() -> Optional[float]:
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def cap(seconds: Optional[float]) -> Optional[float]:
+    left = remaining()
+    if left is None:
+        return seconds
+    return left if seconds is None else min(seconds, left)
+
+
+def check(what: str, needed: float = MIN_CALL_SECONDS) -> None:
+    left = remaining()
+    if left is not None and left < needed:
+        raise DeadlineExceeded(f"{left * 1000:.0f}ms left, not enough for {what}")
@@ -1,13 +1,22 @@
+import asyncio
 import json
 import logging
+import math
 import os
-from typing import Any, Callable, Dict, Literal, Optional
+import re
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Literal, Optional
 
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
+from app import deadline, env_flag, metrics, ratelimit
+from app.deadline import DeadlineExceeded
+from app.ratelimit import RateLimitExceeded
+from app.cache import MemoryCache
+from app.normalize import canonicalize
 
-load_dotenv()
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +24,40 @@ Language = Literal["en", "am"]
 GuardrailStatus = Literal["ok", "gibberish", "abuse"]
 
 GUARDRAIL_MODEL = os.getenv("GEMINI_GUARDRAIL_MODEL", "gemini-2.0-flash-lite")
+GUARDRAIL_MAX_OUTPUT_TOKENS = 128
+# Decide obvious inputs locally and only send ambiguous ones to the guardrail model
+LOCAL_GUARDRAIL = env_flag("GUARDRAIL_LOCAL_TIER", True)
+GUARDRAIL_CACHE_SIZE = int(os.getenv("GUARDRAIL_CACHE_SIZE", "2048"))
+GUARDRAIL_CACHE_TTL_SECONDS = float(os.getenv("GUARDRAIL_CACHE_TTL_SECONDS", "86400"))
+
+_verdict_cache = MemoryCache("guardrail", GUARDRAIL_CACHE_SIZE, GUARDRAIL_CACHE_TTL_SECONDS)
+_verdict_counts: Counter = Counter()
+
+# Most frequent English letter bigrams; keyboard mashing rarely stays inside this set
+_COMMON_BIGRAMS = frozenset(
+    "th he in er an re on at en nd ti es or te of ed is it al ar st to nt ng se ha as ou io le ve co me de "
+    "hi ri ro ic ne ea ra ce li ch ll be ma si om ur ca el ta la ns di fo ho pe ec pr no ct us ac ot il tr "
+    "ly nc et ut ss so rs un lo wa ge ie wh ee wi em ad ol rt po we na ul ni ts mo ow pa im mi ai sh ir su "
+    "id os iv ia am fi ci vi pl ig tu ev ld ry mp fe bl ab gh ty op wo sa ay ex ke fr oo av ag if ap gr od "
+    "bo sp rd do uc bu ei ov by rm ep tt oc fa ef cu rn sc gi da yo cr cl du ga qu ue ff ba ey ls va um pp "
+    "ua up lu go ht ru ug ds lt pi rc rr eg au ck ew mu br bi pt ak pu ui rg ib tl ny ki rk ys ob mm fu ph "
+    "og ms ye ud mb ip ub oi rl gu dr hr cc tw ft wn nu af hu nn eo vo rv nf xp gn sm fl iz ok".split()
+)
+# Insults decide locally only when aimed at the reader ("you idiot", "fuck you"); the same words in
+# a goal ("stupid mistakes", "The Idiot", "a bullshit detector") go to the model like any other text
+_INSULT_EN = (
+    r"(?:idiots?|stupid|morons?|retard(?:ed)?|bitch|bastard|asshole|cunt|dickheads?|shitheads?|scum|imbecile"
+    r"|fuck\w*|motherf\w*)"
+)
+_TARGETED_ABUSE_EN = re.compile(
+    rf"\b(?:you|u)(?:\W*(?:re|r|are))?\s+(?:(?:a|an|such|so|the|total|complete|absolute|fucking|little)\s+){{0,3}}"
+    rf"{_INSULT_EN}\b|\bfuck\s+(?:you|u|off)\b"
+)
+_INSULT_AM = "|".join(re.escape(canonicalize(word)) for word in ("ደደብ", "ጅል", "ደንቆሮ", "ባለጌ", "ሞኝ"))
+_TARGETED_ABUSE_AM = re.compile(
+    rf"(?:አንተ|አንቺ|እናንተ)\s+(?:\S+\s+)?(?:{_INSULT_AM})|(?:{_INSULT_AM})\s+(?:ነህ|ነሽ|ናችሁ)|{canonicalize('ገደል ግባ')}"
+)
+_LATIN_WORD = re.compile(r"[a-z]+")
 
 
 def _build_guardrail_prompt(goal: str) -> str:
@@ -30,11 +73,15 @@ Goal: "{goal_clean}"
 """
 
 
-def _build_guardrail_config() -> types.GenerateContentConfig:
+def _build_guardrail_config() -> "types.GenerateContentConfig":
+    from google.genai import types
+
+    left = deadline.remaining()
     return types.GenerateContentConfig(
         response_mime_type="application/json",
         temperature=0.0,
-        max_output_tokens=128,
+        max_output_tokens=GUARDRAIL_MAX_OUTPUT_TOKENS,
+        http_options=types.HttpOptions(timeout=max(1, int(left * 1000))) if left is not None else None,
     )
 
 
@@ -52,39 +99,192 @@ def _heuristic_guardrail(goal: str) -> Dict[str, str]:
     return {"status": "ok", "reason": "heuristic pass"}
 
 
+def _script_of(ch: str) -> str:
+    code = ord(ch)
+    if 0x1200 <= code <= 0x139F or 0x2D80 <= code <= 0x2DDF or 0xAB00 <= code <= 0xAB2F:
+        return "ethiopic"
+    if code < 0x250:
+        return "latin"
+    return "other"
+
+
+def _entropy(text: str) -> float:
+    counts = Counter(text)
+    total = len(text)
+    return -sum((n / total) * math.log2(n / total) for n in counts.values())
+
+
+def _longest_run(text: str) -> int:
+    longest = run = 0
+    previous = ""
+    for ch in text:
+        run = run + 1 if ch == previous else 1
+        previous = ch
+        longest = max(longest, run)
+    return longest
+
+
+def _local_guardrail(goal: str) -> Optional[Dict[str, str]]:
+    # Decides only clear negatives (noise, targeted insults); everything else, including fluent text,
+    # escalates to the model and its verdict cache, since harmful intent needs no abusive words
+    text = canonicalize(goal)
+    compact = text.replace(" ", "")
+    if not compact:
+        return {"status": "gibberish", "reason": "empty input"}
+    words = text.split()
+
+    if _TARGETED_ABUSE_EN.search(text) or _TARGETED_ABUSE_AM.search(text):
+        return {"status": "abuse", "reason": "local: insult aimed at the reader"}
+
+    letters = [ch for ch in compact if ch.isalpha()]
+    if len(compact) >= 3 and len(letters) / len(compact) < 0.3 and not any(ch.isdigit() for ch in compact):
+        return {"status": "gibberish", "reason": "local: symbol or emoji noise"}
+    if len(compact) >= 6 and _longest_run(compact) / len(compact) >= 0.5:
+        return {"status": "gibberish", "reason": "local: repeated characters"}
+    if len(compact) >= 12 and (_entropy(compact) < 2.0 or len(set(letters)) <= 2):
+        return {"status": "gibberish", "reason": "local: low-information noise"}
+
+    scripts = Counter(_script_of(ch) for ch in letters)
+    mixed = sum(1 for count in scripts.values() if count / max(len(letters), 1) >= 0.1)
+    if mixed >= 3:
+        return {"status": "gibberish", "reason": "local: mixed-script noise"}
+
+    if len(words) < 2 or not letters:
+        return None
+    dominant, dominant_count = scripts.most_common(1)[0]
+    if dominant == "latin" and dominant_count / len(letters) >= 0.8:
+        bigrams = [word[i:i + 2] for word in _LATIN_WORD.findall(text) for i in range(len(word) - 1)]
+        if len(bigrams) >= 4 and sum(1 for bigram in bigrams if bigram in _COMMON_BIGRAMS) / len(bigrams) < 0.45:
+            return {"status": "gibberish", "reason": "local: implausible letter sequences"}
+    return None
+
+
+def pre_classify(goal: str) -> Optional[Dict[str, str]]:
+    if not goal or not goal.strip():
+        _verdict_counts["local_gibberish"] += 1
+        return {"status": "gibberish", "reason": "empty input"}
+    if LOCAL_GUARDRAIL:
+        verdict = _local_guardrail(goal)
+        if verdict is not None:
+            _verdict_counts[f"local_{verdict['status']}"] += 1
+            return verdict
+    cached = _verdict_cache.get(canonicalize(goal))
+    if cached is not None:
+        verdict = cached.to_dict()
+        _verdict_counts[f"cached_{verdict['status']}"] += 1
+        return verdict
+    return None
+
+
+def remember_verdict(goal: str, verdict: Dict[str, str]) -> Dict[str, str]:
+    _verdict_counts[f"model_{verdict['status']}"] += 1
+    _verdict_cache.set(canonicalize(goal), verdict)
+    return verdict
+
+
+def _observe_guardrail_call(started: float, response: Any) -> None:
+    metrics.MODEL_LATENCY.observe(time.monotonic() - started, model=GUARDRAIL_MODEL, outcome="ok")
+    metrics.record_usage(GUARDRAIL_MODEL, response, "guardrail")
+
+
+def guardrail_stats() -> Dict[str, int]:
+    return {**_verdict_counts, "cache_size": len(_verdict_cache)}
+
+
 def classify_goal(
     goal: str,
-    client: Optional[genai.Client],
+    client: Optional["genai.Client"],
     extract_response_text: Callable[[Any], str],
 ) -> Dict[str, str]:
-    if not goal or not goal.strip():
-        return {"status": "gibberish", "reason": "empty input"}
+    verdict = pre_classify(goal)
+    if verdict is not None:
+        return verdict
 
     if not client:
         return _heuristic_guardrail(goal)
 
     prompt = _build_guardrail_prompt(goal)
     try:
+        deadline.check("the guardrail model")
+        ratelimit.acquire_sync(
+            GUARDRAIL_MODEL, prompt, GUARDRAIL_MAX_OUTPUT_TOKENS, deadline.cap(ratelimit.MAX_WAIT_SECONDS)
+        )
+        started = time.monotonic()
         response = client.models.generate_content(
             model=GUARDRAIL_MODEL,
             contents=prompt,
             config=_build_guardrail_config(),
         )
-        payload = extract_response_text(response)
-        data = json.loads(payload)
-        raw_status = str(data.get("status", "ok")).lower()
-        normalized: GuardrailStatus = "ok"
-        if raw_status.startswith("gib"):
-            normalized = "gibberish"
-        elif raw_status.startswith("abuse") or raw_status.startswith("harass"):
-            normalized = "abuse"
-        reason = str(data.get("reason", "")) or ""
-        return {"status": normalized, "reason": reason}
+        _observe_guardrail_call(started, response)
+        return remember_verdict(goal, _parse_guardrail_payload(extract_response_text(response)))
+    except RateLimitExceeded as exc:
+        logger.warning("Guardrail model over local quota (%s); using heuristic check", exc)
+        return _heuristic_guardrail(goal)
+    except (DeadlineExceeded, asyncio.TimeoutError) as exc:
+        # The plan still needs time after the verdict; a local check beats spending it all here
+        logger.warning("Guardrail model out of request time (%s); using heuristic check", exc or "timed out")
+        return _heuristic_guardrail(goal)
+    except Exception as exc:
+        logger.warning("Guardrail classification failed: %s", exc)
+        return {"status": "ok", "reason": "guardrail_error"}
+
+
+async def classify_goal_async(
+    goal: str,
+    client: Optional["genai.Client"],
+    extract_response_text: Callable[[Any], str],
+) -> Dict[str, str]:
+    verdict = pre_classify(goal)
+    if verdict is not None:
+        return verdict
+
+    if not client:
+        return _heuristic_guardrail(goal)
+
+    prompt = _build_guardrail_prompt(goal)
+    try:
+        deadline.check("the guardrail model")
+        await ratelimit.acquire(
+            GUARDRAIL_MODEL, prompt, GUARDRAIL_MAX_OUTPUT_TOKENS, deadline.cap(ratelimit.MAX_WAIT_SECONDS)
+        )
+        started = time.monotonic()
+        response = await asyncio.wait_for(
+            client.aio.models.generate_content(
+                model=GUARDRAIL_MODEL,
+                contents=prompt,
+                config=_build_guardrail_config(),
+            ),
+            deadline.remaining(),
+        )
+        _observe_guardrail_call(started, response)
+        return remember_verdict(goal, _parse_guardrail_payload(extract_response_text(response)))
+    except RateLimitExceeded as exc:
+        logger.warning("Guardrail model over local quota (%s); using heuristic check", exc)
+        return _heuristic_guardrail(goal)
+    except (DeadlineExceeded, asyncio.TimeoutError) as exc:
+        # The plan still needs time after the verdict; a local check beats spending it all here
+        logger.warning("Guardrail model out of request time (%s); using heuristic check", exc or "timed out")
+        return _heuristic_guardrail(goal)
     except Exception as exc:
         logger.warning("Guardrail classification failed: %s", exc)
         return {"status": "ok", "reason": "guardrail_error"}
 
 
+def _parse_guardrail_payload(payload: str) -> Dict[str, str]:
+    return normalize_verdict(json.loads(payload))
+
+
+def normalize_verdict(data: Dict[str, Any]) -> Dict[str, str]:
+    raw_status = str(data.get("status", "ok")).lower()
+    normalized: GuardrailStatus = "ok"
+    if raw_status.startswith("gib"):
+        normalized = "gibberish"
+    elif raw_status.startswith("abuse") or raw_status.startswith("harass"):
+        normalized = "abuse"
+    reason = str(data.get("reason", "")) or ""
+    return {"status": normalized, "reason": reason}
+
+
 def gibberish_plan(language: Language, reason: Optional[str] = None) -> Dict[str, Any]:
     detail = reason or "input could not be interpreted"
     steps = {
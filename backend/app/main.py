@@ -1,10 +1,39 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from app.services import generate_breakdown, generate_sub_breakdown
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.services import (
+    MAX_BATCH_STEPS,
+    TREE_MAX_DEPTH,
+    generate_breakdown_result_async,
+    generate_sub_breakdown_batch_async,
+    generate_sub_breakdown_result_async,
+    stream_breakdown_async,
+    start_background_warm_up,
+    stream_breakdown_tree_async,
+    warm_up,
+)
+from app import deadline, metrics, snapshot
+from app.cache import CachedResult
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Smart Goal Breaker API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(snapshot.restore_on_startup)
+    app.state.background_warm_up = start_background_warm_up()
+    await warm_up()
+    yield
+    await asyncio.to_thread(snapshot.save_on_shutdown)
+
+app = FastAPI(title="Smart Goal Breaker API", lifespan=lifespan)
 
 # Allow CORS for frontend
 app.add_middleware(
@@ -15,30 +44,140 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class MetricsMiddleware:
+    # Pure ASGI so streamed responses are timed until their last byte without buffering
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.monotonic()
+        known_paths = {getattr(route, "path", None) for route in scope["app"].routes}
+        path = scope["path"] if scope["path"] in known_paths else "unmatched"
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        metrics.HTTP_IN_FLIGHT.inc(endpoint=path)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec(endpoint=path)
+            elapsed = time.monotonic() - started
+            route = scope.get("route")
+            # Label by route template so unknown paths cannot explode series cardinality
+            endpoint = getattr(route, "path", None) or "unmatched"
+            metrics.HTTP_LATENCY.observe(elapsed, endpoint=endpoint, method=scope["method"], status=str(status["code"]))
+            if endpoint not in ("/", "/metrics", "unmatched"):
+                metrics.RECENT_LATENCY.add(elapsed)
+
+app.add_middleware(MetricsMiddleware)
+
 class GoalRequest(BaseModel):
     goal: str
     language: str = "en"
 
+class TreeRequest(BaseModel):
+    goal: str
+    language: str = "en"
+    depth: int = Field(2, ge=1, le=TREE_MAX_DEPTH)
+    budget: Optional[int] = Field(None, ge=0)
+
 class SubStepRequest(BaseModel):
     step: str
     language: str = "en"
 
+class SubStepBatchRequest(BaseModel):
+    steps: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_STEPS)
+    language: str = "en"
+
 @app.get("/")
 def read_root():
-    return {"status": "System Online", "latency": "12ms"}
+    return metrics.status_snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so a W/ prefix from a proxy still matches
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+def _cached_response(http_request: Request, result: CachedResult) -> Response:
+    # Serves the bytes encoded at cache-store time; FastAPI validation and re-encoding are skipped
+    headers = {"ETag": result.etag}
+    if_none_match = http_request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, result.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=result.body, media_type="application/json", headers=headers)
+
+def _request_deadline(http_request: Request):
+    return deadline.use_deadline(deadline.parse_header(http_request.headers.get(deadline.HEADER)))
 
 @app.post("/breakdown")
-def breakdown_goal(request: GoalRequest):
+async def breakdown_goal(request: GoalRequest, http_request: Request):
     try:
-        result = generate_breakdown(request.goal, request.language)
-        return result
+        with _request_deadline(http_request):
+            result = await generate_breakdown_result_async(request.goal, request.language)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return _cached_response(http_request, result)
+
+def _sse(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/breakdown/stream")
+async def breakdown_goal_stream(request: GoalRequest):
+    async def event_source():
+        try:
+            async for item in stream_breakdown_async(request.goal, request.language):
+                yield _sse(item["event"], item["data"])
+        except Exception as e:
+            logger.error("Streaming breakdown failed: %s", e)
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/breakdown/tree")
+async def breakdown_goal_tree(request: TreeRequest):
+    async def lines():
+        try:
+            async for item in stream_breakdown_tree_async(request.goal, request.language, request.depth, request.budget):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error("Tree breakdown failed: %s", e)
+            yield json.dumps({"event": "error", "data": {"detail": str(e)}}) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/sub-breakdown")
-def sub_breakdown_step(request: SubStepRequest):
+async def sub_breakdown_step(request: SubStepRequest, http_request: Request):
+    try:
+        with _request_deadline(http_request):
+            result = await generate_sub_breakdown_result_async(request.step, request.language)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return _cached_response(http_request, result)
+
+@app.post("/sub-breakdown/batch")
+async def sub_breakdown_batch(request: SubStepBatchRequest, http_request: Request):
     try:
-        result = generate_sub_breakdown(request.step, request.language)
-        return result
+        with _request_deadline(http_request):
+            results = await generate_sub_breakdown_batch_async(request.steps, request.language)
+        return {"results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,140 @@
+import hashlib
+import random
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+# Amharic spells several sounds with interchangeable syllable families (ሀ/ሐ/ኀ, ሰ/ሠ, አ/ዐ, ጸ/ፀ).
+# Each family is an 8-codepoint block, so folding keeps the vowel order intact.
+_GEEZ_FAMILY_FOLDS = {
+    0x1210: 0x1200,  # ሐ -> ሀ
+    0x1280: 0x1200,  # ኀ -> ሀ
+    0x1220: 0x1230,  # ሠ -> ሰ
+    0x12D0: 0x12A0,  # ዐ -> አ
+    0x1340: 0x1338,  # ፀ -> ጸ
+}
+_ETHIOPIC_WORDSPACE = "፡"
+# Only sentence punctuation and quotes fold away; "#", "%", "&", "@" and "/" change what a goal
+# means ("Learn C#", "Cut costs 50%"), so they are kept
+_SENTENCE_PUNCTUATION = set(".,!?;:\"“”„«»‹›`") | set("።፣፤፥፦፧")
+# Kept (in one canonical form) between letters or digits: "re-sign", "don't", "node.js", "3.5"
+_APOSTROPHES = {"'", "’", "ʼ", "‘"}
+_INFIX_PUNCTUATION = set(".,:")
+
+
+def _fold_geez(ch: str) -> str:
+    code = ord(ch)
+    base = code & ~7
+    folded = _GEEZ_FAMILY_FOLDS.get(base)
+    return chr(folded + code - base) if folded is not None else ch
+
+
+def _between_word_chars(text: str, index: int) -> bool:
+    return 0 < index < len(text) - 1 and text[index - 1].isalnum() and text[index + 1].isalnum()
+
+
+def canonicalize(text: str) -> str:
+    folded = unicodedata.normalize("NFKC", unicodedata.normalize("NFKC", text).casefold())
+    out: List[str] = []
+    for index, ch in enumerate(folded):
+        if ch == _ETHIOPIC_WORDSPACE or ch.isspace():
+            out.append(" ")
+            continue
+        if unicodedata.category(ch) == "Pd":
+            out.append("-" if _between_word_chars(folded, index) else " ")
+            continue
+        if ch in _APOSTROPHES:
+            out.append("'" if _between_word_chars(folded, index) else " ")
+            continue
+        if ch in _INFIX_PUNCTUATION and _between_word_chars(folded, index):
+            out.append(ch)
+            continue
+        if ch in _SENTENCE_PUNCTUATION:
+            out.append(" ")
+            continue
+        out.append(_fold_geez(ch))
+    canonical = " ".join("".join(out).split())
+    # Pure punctuation must not collapse onto one shared empty key
+    return canonical or " ".join(folded.split())
+
+
+def shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    padded = f" {text} "
+    if len(padded) <= size:
+        return frozenset([padded])
+    return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+
+class MinHashIndex:
+    # Character n-gram MinHash with LSH banding; candidates are confirmed with exact Jaccard.
+    # Permutations are XOR masks over a 64-bit hash, which keeps a signature well under a millisecond.
+    def __init__(self, threshold: float, maxsize: int, num_perm: int = 64, bands: int = 16, seed: int = 7) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(64) for _ in range(num_perm)]
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, FrozenSet[str], List[Tuple[int, ...]]]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = {}
+        self.matches = 0
+
+    def _signature(self, grams: FrozenSet[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little") for gram in grams]
+        return [min([h ^ mask for h in hashes]) for mask in self._masks]
+
+    def _bands(self, signature: List[int]) -> List[Tuple[int, ...]]:
+        return [tuple(signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def add(self, namespace: str, text: str, key: str) -> None:
+        grams = shingles(text)
+        bands = self._bands(self._signature(grams))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (namespace, grams, bands)
+            for index, band in enumerate(bands):
+                self._buckets.setdefault((namespace, index, band), set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        namespace, _, bands = entry
+        for index, band in enumerate(bands):
+            bucket = self._buckets.get((namespace, index, band))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[(namespace, index, band)]
+
+    def query(self, namespace: str, text: str) -> Optional[str]:
+        grams = shingles(text)
+        bands = self._bands(self._signature(grams))
+        best: Optional[str] = None
+        best_score = self.threshold
+        with self._lock:
+            candidates: Set[str] = set()
+            for index, band in enumerate(bands):
+                candidates |= self._buckets.get((namespace, index, band), set())
+            for key in candidates:
+                other = self._entries[key][1]
+                score = len(grams & other) / len(grams | other)
+                if score >= best_score:
+                    best, best_score = key, score
+            if best is not None:
+                self.matches += 1
+        return best
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
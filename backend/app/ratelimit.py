@@ -0,0 +1,254 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SUB_BREAKDOWN = 1
+PRIORITY_PREFETCH = 2
+
+DEFAULT_RPM = float(os.getenv("GEMINI_DEFAULT_RPM", "0"))
+DEFAULT_TPM = float(os.getenv("GEMINI_DEFAULT_TPM", "0"))
+MAX_QUEUE = int(os.getenv("RATE_LIMIT_MAX_QUEUE", "100"))
+MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_MS", "3000")) / 1000.0
+CHARS_PER_TOKEN = 4
+
+request_priority: contextvars.ContextVar[int] = contextvars.ContextVar("request_priority", default=PRIORITY_INTERACTIVE)
+
+
+class CallTally:
+    # Upstream calls admitted on behalf of one unit of work (e.g. a tree), guardrail calls included
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self) -> None:
+        with self._lock:
+            self.count += 1
+
+
+request_tally: contextvars.ContextVar[Optional[CallTally]] = contextvars.ContextVar("request_tally", default=None)
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+def _parse_limits(raw: Optional[str]) -> Dict[str, float]:
+    # "gemini-2.5-flash=10,gemini-2.0-flash=15"
+    limits: Dict[str, float] = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        model, value = item.split("=", 1)
+        try:
+            limits[model.strip()] = float(value)
+        except ValueError:
+            logger.warning("Ignoring invalid rate limit entry %r", item)
+    return limits
+
+
+RPM_LIMITS = _parse_limits(os.getenv("GEMINI_RPM_LIMITS"))
+TPM_LIMITS = _parse_limits(os.getenv("GEMINI_TPM_LIMITS"))
+
+
+def estimate_tokens(prompt: str, max_output_tokens: int) -> int:
+    return len(prompt) // CHARS_PER_TOKEN + max_output_tokens
+
+
+@contextlib.contextmanager
+def use_priority(priority: int) -> Iterator[None]:
+    # Never promotes: prefetch work that reaches a sub-breakdown path stays at prefetch priority
+    token = request_priority.set(max(priority, request_priority.get()))
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        # Requests larger than the whole bucket are admitted once it is full
+        needed = min(amount, self.capacity) - self.tokens
+        return max(0.0, needed / self.rate)
+
+    def consume(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class ModelLimiter:
+    def __init__(self, model: str, rpm: float, tpm: float, max_queue: int = MAX_QUEUE) -> None:
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[int, int, int]] = []
+        self._sequence = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.queued = 0
+
+    @property
+    def unlimited(self) -> bool:
+        return self.requests.capacity <= 0 and self.tokens.capacity <= 0
+
+    def _wait_for(self, requests: int, tokens: int, now: float) -> float:
+        return max(self.requests.time_until(requests, now), self.tokens.time_until(tokens, now))
+
+    def _ahead_of(self, priority: int) -> Tuple[int, int]:
+        ahead = [entry for entry in self._queue if entry[0] <= priority]
+        return len(ahead), sum(entry[2] for entry in ahead)
+
+    def _try_admit(self, entry: Tuple[int, int, int], now: float) -> float:
+        # Returns 0 when admitted, otherwise the time until this entry could be admitted
+        if self._queue and self._queue[0] != entry:
+            return max(0.005, self._wait_for(1, self._queue[0][2], now))
+        wait = self._wait_for(1, entry[2], now)
+        if wait > 0:
+            return wait
+        if self._queue:
+            heapq.heappop(self._queue)
+        self.requests.consume(1)
+        self.tokens.consume(entry[2])
+        self.admitted += 1
+        return 0.0
+
+    def _enqueue(self, tokens: int, priority: int, max_wait: float) -> Tuple[int, int, int]:
+        now = time.monotonic()
+        ahead_requests, ahead_tokens = self._ahead_of(priority)
+        estimate = self._wait_for(ahead_requests + 1, ahead_tokens + tokens, now)
+        if estimate > max_wait or len(self._queue) >= self.max_queue:
+            self.rejected += 1
+            raise RateLimitExceeded(
+                f"{self.model} admission would wait {estimate:.2f}s (limit {max_wait:.2f}s, queue {len(self._queue)})"
+            )
+        entry = (priority, next(self._sequence), tokens)
+        if estimate > 0 or self._queue:
+            heapq.heappush(self._queue, entry)
+            self.queued += 1
+        return entry
+
+    def _abandon(self, entry: Tuple[int, int, int]) -> None:
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+
+    async def acquire(self, tokens: int, priority: int, max_wait: float = MAX_WAIT_SECONDS) -> None:
+        if self.unlimited:
+            return
+        deadline = time.monotonic() + max_wait
+        with self._lock:
+            entry = self._enqueue(tokens, priority, max_wait)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_admit(entry, time.monotonic())
+                if wait <= 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self.rejected += 1
+                    raise RateLimitExceeded(f"{self.model} admission deadline exceeded")
+                await asyncio.sleep(min(wait, remaining))
+        finally:
+            with self._lock:
+                self._abandon(entry)
+
+    def acquire_sync(self, tokens: int, priority: int, max_wait: float = MAX_WAIT_SECONDS) -> None:
+        if self.unlimited:
+            return
+        deadline = time.monotonic() + max_wait
+        with self._lock:
+            entry = self._enqueue(tokens, priority, max_wait)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_admit(entry, time.monotonic())
+                if wait <= 0:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self.rejected += 1
+                    raise RateLimitExceeded(f"{self.model} admission deadline exceeded")
+                time.sleep(min(wait, remaining))
+        finally:
+            with self._lock:
+                self._abandon(entry)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "queued": self.queued,
+                "queue_depth": len(self._queue),
+            }
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(model: str) -> ModelLimiter:
+    with _registry_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = ModelLimiter(model, RPM_LIMITS.get(model, DEFAULT_RPM), TPM_LIMITS.get(model, DEFAULT_TPM))
+            _limiters[model] = limiter
+        return limiter
+
+
+async def acquire(model: str, prompt: str, max_output_tokens: int, max_wait: Optional[float] = None) -> None:
+    wait = MAX_WAIT_SECONDS if max_wait is None else max_wait
+    await get_limiter(model).acquire(estimate_tokens(prompt, max_output_tokens), request_priority.get(), wait)
+    _tally_call()
+
+
+def acquire_sync(model: str, prompt: str, max_output_tokens: int, max_wait: Optional[float] = None) -> None:
+    wait = MAX_WAIT_SECONDS if max_wait is None else max_wait
+    get_limiter(model).acquire_sync(estimate_tokens(prompt, max_output_tokens), request_priority.get(), wait)
+    _tally_call()
+
+
+def _tally_call() -> None:
+    # Every upstream attempt passes through admission, so this sees retries, fallbacks and hedges too
+    tally = request_tally.get()
+    if tally is not None:
+        tally.add()
+
+
+def limiter_stats() -> Dict[str, Dict[str, float]]:
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return {limiter.model: limiter.snapshot() for limiter in limiters if not limiter.unlimited}
+
+
+def reset_limiters() -> None:
+    with _registry_lock:
+        _limiters.clear()
@@ -1,29 +1,99 @@
-import copy
+import asyncio
+import contextvars
 import json
 import logging
 import os
 import random
+import re
+import threading
 import time
-from functools import lru_cache
-from typing import Any, Dict, List, Optional, Callable
+from collections import deque
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Dict, Iterator, List, Mapping, Optional, Callable, Tuple
 
-import google.genai as genai
-from google.genai import types
-from dotenv import load_dotenv
-from app.guardrails import Language, classify_goal, gibberish_plan, abuse_plan
+from app.cache import CachedResult, CacheValue, build_cache, make_key
+from app.circuit import ProbeInFlight, circuit_stats, get_breaker, route_models
+from app.normalize import MinHashIndex, canonicalize
+from app import budget, deadline, env_flag, metrics
+from app.budget import CallKind
+from app import ratelimit
+from app.deadline import DeadlineExceeded
+from app.ratelimit import PRIORITY_PREFETCH, PRIORITY_SUB_BREAKDOWN, use_priority
+from app.guardrails import (
+    Language,
+    abuse_plan,
+    classify_goal,
+    classify_goal_async,
+    gibberish_plan,
+    guardrail_stats,
+    normalize_verdict,
+    pre_classify,
+    remember_verdict,
+)
 
-load_dotenv()
+if TYPE_CHECKING:
+    from google.genai import types
 
 logger = logging.getLogger(__name__)
 
-# Configure Gemini
+# Configure Gemini. google.genai is imported and the client built on first use, not at import:
+# the SDK import alone dominates cold start. Tests and benchmarks may assign `client` directly.
 api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key) if api_key else None
+_UNSET: Any = object()
+client: Any = _UNSET
+_client_lock = threading.Lock()
+
+
+def get_client() -> Any:
+    global client
+    if client is _UNSET:
+        with _client_lock:
+            if client is _UNSET:
+                client = _build_client()
+    return client
+
+
+def _build_client() -> Any:
+    if not api_key:
+        return None
+    from google import genai
+
+    return genai.Client(api_key=api_key)
 
 TEMPERATURE = float(os.getenv("GEMINI_TEMPERATURE", "0.1"))
 MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "512"))
 MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
 BASE_RETRY_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1.0"))
+BREAKDOWN_CACHE_SIZE = int(os.getenv("BREAKDOWN_CACHE_SIZE", "256"))
+SUB_BREAKDOWN_CACHE_SIZE = int(os.getenv("SUB_BREAKDOWN_CACHE_SIZE", "512"))
+
+# Run the guardrail and the plan call in parallel; flagged goals discard the plan
+SPECULATIVE_GUARDRAIL = env_flag("GUARDRAIL_SPECULATIVE")
+# "combined" asks one prompt for the guardrail verdict and the plan together (one call instead of two)
+GUARDRAIL_MODE = os.getenv("GUARDRAIL_MODE", "separate").strip().lower()
+MAX_BATCH_STEPS = int(os.getenv("SUB_BREAKDOWN_BATCH_MAX_STEPS", "10"))
+
+# Whole-tree expansion: levels below the goal, parallel sibling groups, and upstream calls per tree
+TREE_MAX_DEPTH = int(os.getenv("TREE_MAX_DEPTH", "3"))
+TREE_CONCURRENCY = int(os.getenv("TREE_CONCURRENCY", "3"))
+TREE_CALL_BUDGET = int(os.getenv("TREE_CALL_BUDGET", "12"))
+
+# Jaccard similarity (character trigrams) at which a cached goal answers a near-duplicate; 0 disables
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("GOAL_SIMILARITY_THRESHOLD", "0"))
+
+# Opt-in warm-up of substeps for freshly generated plans
+PREFETCH_SUBSTEPS = env_flag("PREFETCH_SUBSTEPS")
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+PREFETCH_CALLS_PER_MINUTE = int(os.getenv("PREFETCH_CALLS_PER_MINUTE", "30"))
+PREFETCH_PRESSURE_INFLIGHT = int(os.getenv("PREFETCH_PRESSURE_INFLIGHT", "32"))
+
+# Launch the next model in the chain if the current one has not answered in time; 0 disables
+HEDGE_AFTER_SECONDS = float(os.getenv("GEMINI_HEDGE_AFTER_MS", "0")) / 1000.0
+
+# Work done in the startup hook instead of on the first request: "client", "connection", "cache"
+WARMUP_TARGETS = {t.strip().lower() for t in os.getenv("STARTUP_WARMUP", "").split(",") if t.strip()}
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_WARMUP_TIMEOUT_MS", "5000")) / 1000.0
+# Import the SDK and build the client in a worker thread right after startup, without delaying it
+BACKGROUND_CLIENT_WARMUP = env_flag("STARTUP_BACKGROUND_CLIENT", True)
 
 # Allow ops to override model priority without code changes
 DEFAULT_MODEL_CHAIN = [
@@ -75,31 +145,146 @@ Output strictly valid JSON in this format:
     return prompt
 
 
-def _build_generation_config() -> types.GenerateContentConfig:
+def _build_combined_prompt(goal: str, language: Language) -> str:
+    goal_clean = goal.strip()
+    if not goal_clean:
+        raise ValueError("Goal cannot be empty")
+    prompt = f"""
+You are an elite strategic planner and the mission-control gatekeeper for incoming goals.
+First classify the goal with one of three labels:
+- OK: valid, actionable, professional request.
+- GIBBERISH: nonsense, repeated characters, emoji spam, or unparseable noise.
+- ABUSE: insults, harassment, hateful or profane language toward the operator.
+
+Goal: "{goal_clean}"
+
+If the label is OK, break the goal down into exactly 5 high-impact, actionable, and chronologically ordered steps:
+1. Analyze the goal to understand the core objective and implied constraints.
+2. Determine the complexity level (1-10) based on resource requirements, time, and skill.
+3. Each step must be action-oriented (start with a strong verb), specific and measurable,
+   logical in sequence, and "Dark Technical" in tone (concise, professional, no fluff).
+If the label is not OK, return an empty steps array and complexity 0.
+
+Output strictly valid JSON in this format:
+{{
+    "status": "<OK|GIBBERISH|ABUSE>",
+    "reason": "<short explanation>",
+    "steps": ["step1", "step2", "step3", "step4", "step5"],
+    "complexity": <integer between 1-10>
+}}
+"""
+    if language == "am":
+        prompt += "\nWhen responding, return the same JSON structure but write every step description in modern Amharic while keeping the Dark Technical tone concise and precise."
+    return prompt
+
+
+def _build_generation_config(max_output_tokens: Optional[int] = None) -> "types.GenerateContentConfig":
+    from google.genai import types
+
+    # The HTTP timeout follows the request deadline so a slow model cannot outlive the request
+    left = deadline.remaining()
     return types.GenerateContentConfig(
         response_mime_type="application/json",
         temperature=TEMPERATURE,
-        max_output_tokens=MAX_OUTPUT_TOKENS,
+        max_output_tokens=max_output_tokens or MAX_OUTPUT_TOKENS,
+        http_options=types.HttpOptions(timeout=max(1, int(left * 1000))) if left is not None else None,
     )
 
 
-def _call_model(model: str, prompt: str, parser_func: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+class _UpstreamCall:
+    # Wraps one Gemini request: circuit breaker bookkeeping, in-flight gauge, latency and token metrics
+    def __init__(self, model: str, kind: CallKind) -> None:
+        self.model = model
+        self.kind = kind
+        self.breaker = get_breaker(model)
+        self.response: Any = None
+        self.started = 0.0
+
+    def __enter__(self) -> "_UpstreamCall":
+        if not self.breaker.try_begin():
+            # Another request is already probing this half-open model; the chain moves on
+            raise ProbeInFlight(f"{self.model} is half-open and already being probed")
+        metrics.MODEL_IN_FLIGHT.inc(model=self.model)
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> bool:
+        elapsed = time.monotonic() - self.started
+        metrics.MODEL_IN_FLIGHT.dec(model=self.model)
+        if exc_type is None:
+            self.breaker.record_success(elapsed)
+            metrics.MODEL_LATENCY.observe(elapsed, model=self.model, outcome="ok")
+            budget.observe(self.kind, self.model, self.response)
+        elif issubclass(exc_type, Exception):
+            # A call that used up its time budget counts against the model, so a hung model gets demoted
+            self.breaker.record_failure(elapsed)
+            outcome = "timeout" if issubclass(exc_type, DeadlineExceeded) else "error"
+            metrics.MODEL_LATENCY.observe(elapsed, model=self.model, outcome=outcome)
+        else:
+            # Cancellation (a losing hedge or a client disconnect) says nothing about model health
+            self.breaker.abandon()
+        return False
+
+
+def _generate_content(model: str, prompt: str, kind: CallKind, limit: int) -> Tuple[Any, str]:
+    with _UpstreamCall(model, kind) as call:
+        call.response = get_client().models.generate_content(
+            model=model,
+            contents=prompt,
+            config=_build_generation_config(limit),
+        )
+        return call.response, _extract_response_text(call.response)
+
+
+async def _generate_content_async(model: str, prompt: str, kind: CallKind, limit: int) -> Tuple[Any, str]:
+    with _UpstreamCall(model, kind) as call:
+        call.response = await _within_deadline(
+            get_client().aio.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=_build_generation_config(limit),
+            ),
+            f"{model} response",
+        )
+        return call.response, _extract_response_text(call.response)
+
+
+def _larger_budget(model: str, kind: CallKind, limit: int, response: Any) -> Optional[int]:
+    # An answer cut off at the output budget gets one more try with room to finish
+    if not budget.is_truncated(response):
+        return None
+    larger = budget.expanded_limit(kind, limit)
+    if larger is not None:
+        logger.info("Gemini %s hit the %s-token budget for %s; retrying with %s", model, limit, kind.endpoint, larger)
+        deadline.check(f"a larger-budget call to {model}")
+    return larger
+
+
+def _call_model(
+    model: str, prompt: str, parser_func: Callable[[str], Dict[str, Any]], kind: CallKind
+) -> Dict[str, Any]:
     last_exc: Optional[Exception] = None
+    breaker = get_breaker(model)
+    limit = budget.output_limit(kind, MAX_OUTPUT_TOKENS)
     for attempt in range(1, MAX_RETRIES + 1):
+        deadline.check(f"a call to {model}")
+        # Wait for quota locally (or fail fast) instead of discovering it through a 429
+        ratelimit.acquire_sync(model, prompt, limit, deadline.cap(ratelimit.MAX_WAIT_SECONDS))
         try:
-            response = client.models.generate_content(
-                model=model,
-                contents=prompt,
-                config=_build_generation_config(),
-            )
-            payload = _extract_response_text(response)
+            response, payload = _generate_content(model, prompt, kind, limit)
+            larger = _larger_budget(model, kind, limit, response)
+            if larger is not None:
+                ratelimit.acquire_sync(model, prompt, larger, deadline.cap(ratelimit.MAX_WAIT_SECONDS))
+                _, payload = _generate_content(model, prompt, kind, larger)
             return parser_func(payload)
         except Exception as exc:
             last_exc = exc
-            if not _is_rate_limit_error(exc) or attempt == MAX_RETRIES:
+            # Stop retrying as soon as the breaker trips instead of exhausting MAX_RETRIES
+            if not _is_rate_limit_error(exc) or attempt == MAX_RETRIES or not breaker.available():
                 logger.warning("Gemini model %s failed: %s", model, exc)
                 raise
-            backoff = BASE_RETRY_DELAY * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
+            backoff = _retry_backoff(attempt)
+            _check_retry_budget(model, backoff, exc)
             logger.warning(
                 "Gemini rate limit hit on %s (attempt %s/%s). Retrying in %.2fs",
                 model,
@@ -107,12 +292,132 @@ def _call_model(model: str, prompt: str, parser_func: Callable[[str], Dict[str,
                 MAX_RETRIES,
                 backoff,
             )
+            metrics.MODEL_RETRIES.inc(model=model)
             time.sleep(backoff)
 
     # Should never hit due to raise above but keeps type checker satisfied
     raise last_exc if last_exc else RuntimeError("Unknown Gemini failure")
 
 
+async def _call_model_async(
+    model: str,
+    prompt: str,
+    parser_func: Callable[[str], Dict[str, Any]],
+    kind: CallKind,
+) -> Dict[str, Any]:
+    # Mirrors _call_model on the async client so retries never pin a threadpool worker
+    last_exc: Optional[Exception] = None
+    breaker = get_breaker(model)
+    limit = budget.output_limit(kind, MAX_OUTPUT_TOKENS)
+    for attempt in range(1, MAX_RETRIES + 1):
+        deadline.check(f"a call to {model}")
+        await ratelimit.acquire(model, prompt, limit, deadline.cap(ratelimit.MAX_WAIT_SECONDS))
+        try:
+            response, payload = await _generate_content_async(model, prompt, kind, limit)
+            larger = _larger_budget(model, kind, limit, response)
+            if larger is not None:
+                await ratelimit.acquire(model, prompt, larger, deadline.cap(ratelimit.MAX_WAIT_SECONDS))
+                _, payload = await _generate_content_async(model, prompt, kind, larger)
+            return parser_func(payload)
+        except Exception as exc:
+            last_exc = exc
+            if not _is_rate_limit_error(exc) or attempt == MAX_RETRIES or not breaker.available():
+                logger.warning("Gemini model %s failed: %s", model, exc)
+                raise
+            backoff = _retry_backoff(attempt)
+            _check_retry_budget(model, backoff, exc)
+            logger.warning(
+                "Gemini rate limit hit on %s (attempt %s/%s). Retrying in %.2fs",
+                model,
+                attempt,
+                MAX_RETRIES,
+                backoff,
+            )
+            metrics.MODEL_RETRIES.inc(model=model)
+            await asyncio.sleep(backoff)
+
+    raise last_exc if last_exc else RuntimeError("Unknown Gemini failure")
+
+
+def _check_retry_budget(model: str, backoff: float, exc: Exception) -> None:
+    left = deadline.remaining()
+    if left is not None and left < backoff + deadline.MIN_CALL_SECONDS:
+        raise DeadlineExceeded(f"no time left to retry {model} after: {exc}") from exc
+
+
+async def _within_deadline(awaitable: Awaitable[Any], what: str) -> Any:
+    try:
+        return await asyncio.wait_for(awaitable, deadline.remaining())
+    except asyncio.TimeoutError as exc:
+        raise DeadlineExceeded(f"request deadline reached waiting for {what}") from exc
+
+
+def _run_model_chain(prompt: str, parser_func: Callable[[str], Dict[str, Any]], kind: CallKind) -> Dict[str, Any]:
+    last_exc: Optional[Exception] = None
+    for model in route_models(_get_model_chain()):
+        try:
+            result = _call_model(model, prompt, parser_func, kind)
+            logger.debug("Gemini model %s succeeded", model)
+            return result
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            last_exc = exc
+            logger.info("Model %s failed with %s; attempting next fallback", model, exc)
+    raise last_exc if last_exc else RuntimeError("No Gemini models configured")
+
+
+async def _run_model_chain_async(
+    prompt: str,
+    parser_func: Callable[[str], Dict[str, Any]],
+    kind: CallKind,
+) -> Dict[str, Any]:
+    models = route_models(_get_model_chain())
+    last_exc: Optional[Exception] = None
+    pending: Dict["asyncio.Task[Dict[str, Any]]", str] = {}
+    next_index = 0
+
+    def launch() -> None:
+        nonlocal next_index
+        model = models[next_index]
+        next_index += 1
+        pending[asyncio.ensure_future(_call_model_async(model, prompt, parser_func, kind))] = model
+
+    try:
+        while pending or next_index < len(models):
+            if not pending:
+                deadline.check(f"model {models[next_index]}")
+                launch()
+            left = deadline.remaining()
+            can_hedge = left is None or left >= HEDGE_AFTER_SECONDS + deadline.MIN_CALL_SECONDS
+            hedge = HEDGE_AFTER_SECONDS if HEDGE_AFTER_SECONDS > 0 and next_index < len(models) and can_hedge else None
+            done, _ = await asyncio.wait(pending, timeout=deadline.cap(hedge), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if hedge is None or deadline.remaining() == 0:
+                    raise DeadlineExceeded("request deadline reached while waiting on Gemini")
+                logger.info("Model %s slower than %.0fms; hedging with next model", pending[next(iter(pending))], hedge * 1000)
+                launch()
+                continue
+            for task in done:
+                model = pending.pop(task)
+                exc = task.exception()
+                if exc is None:
+                    logger.debug("Gemini model %s succeeded", model)
+                    return task.result()
+                if isinstance(exc, DeadlineExceeded):
+                    raise exc
+                last_exc = exc
+                logger.info("Model %s failed with %s; attempting next fallback", model, exc)
+    finally:
+        for task in pending:
+            task.cancel()
+    raise last_exc if last_exc else RuntimeError("No Gemini models configured")
+
+
+def _retry_backoff(attempt: int) -> float:
+    return BASE_RETRY_DELAY * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
+
+
 def _extract_response_text(response: Any) -> str:
     if response is None:
         raise ValueError("Gemini returned empty response")
@@ -137,25 +442,34 @@ def _extract_response_text(response: Any) -> str:
     raise ValueError("Gemini response contained no text payload")
 
 
-def _safe_parse_response(payload: str, goal: str, language: Language) -> Dict[str, Any]:
+def _safe_parse_response(payload: str, goal: str, language: Language, combined: bool = False) -> Dict[str, Any]:
+    # Combined payloads also carry the guardrail verdict, returned alongside the plan as status/reason
     try:
         data = json.loads(payload)
         if not isinstance(data, dict):
             raise ValueError("Gemini response is not an object")
-        steps = data.get("steps")
-        complexity = data.get("complexity")
-        if not isinstance(steps, list) or len(steps) != 5:
-            raise ValueError("Gemini response must include exactly 5 steps")
-        if not all(isinstance(step, str) and step.strip() for step in steps):
-            raise ValueError("Each step must be a non-empty string")
-        if not isinstance(complexity, int) or not 1 <= complexity <= 10:
-            raise ValueError("Complexity must be an integer between 1 and 10")
-        return {"steps": steps, "complexity": complexity}
+        verdict = normalize_verdict(data) if combined else None
+        if verdict is not None and verdict["status"] != "ok":
+            return {**_guardrail_plan(verdict, language), **verdict}
+        return {**validate_plan(data), **(verdict or {})}
     except Exception as exc:
         logger.error("Failed to parse Gemini response: %s", exc)
         return _offline_plan(goal, language)
 
 
+def validate_plan(data: Mapping[str, Any]) -> Dict[str, Any]:
+    # The plan contract every cached breakdown must meet, whether from Gemini or an import
+    steps = data.get("steps")
+    complexity = data.get("complexity")
+    if not isinstance(steps, list) or len(steps) != 5:
+        raise ValueError("Plan must include exactly 5 steps")
+    if not all(isinstance(step, str) and step.strip() for step in steps):
+        raise ValueError("Each step must be a non-empty string")
+    if not isinstance(complexity, int) or isinstance(complexity, bool) or not 1 <= complexity <= 10:
+        raise ValueError("Complexity must be an integer between 1 and 10")
+    return {"steps": steps, "complexity": complexity}
+
+
 def _safe_parse_sub_response(payload: str, language: Language) -> Dict[str, Any]:
     try:
         data = json.loads(payload)
@@ -239,52 +553,670 @@ def _offline_substeps(language: Language) -> Dict[str, Any]:
     return {"substeps": ["Initialize subsystem.", "Execute protocol.", "Verify status."]}
 
 
-@lru_cache(maxsize=256)
-def _generate_breakdown_cached(goal: str, language: Language) -> Dict[str, Any]:
-    prompt = _build_prompt(goal, language)
-    if not client:
-        return _offline_plan(goal, language)
+# Shared between the sync and async pipelines (and, with the sqlite backend, between workers)
+_breakdown_cache = build_cache("breakdown", BREAKDOWN_CACHE_SIZE)
+_sub_breakdown_cache = build_cache("sub_breakdown", SUB_BREAKDOWN_CACHE_SIZE)
+_goal_index = (
+    MinHashIndex(NEAR_DUPLICATE_THRESHOLD, maxsize=BREAKDOWN_CACHE_SIZE * 4) if NEAR_DUPLICATE_THRESHOLD > 0 else None
+)
 
-    for model in _get_model_chain():
-        try:
-            parser = lambda payload, _goal=goal, _lang=language: _safe_parse_response(payload, _goal, _lang)
-            result = _call_model(model, prompt, parser)
-            logger.debug("Gemini model %s succeeded", model)
-            return result
-        except Exception as exc:
-            logger.info("Model %s failed with %s; attempting next fallback", model, exc)
-            continue
-    logger.error("All Gemini models failed; returning offline fallback")
-    return _offline_plan(goal, language)
 
+def _cache_key(text: str, language: Language) -> str:
+    return make_key(text, language, _get_model_chain())
 
-def generate_breakdown(goal: str, language: str = "en") -> Dict[str, Any]:
+
+def _is_cacheable_plan(result: Mapping[str, Any]) -> bool:
+    # Offline fallbacks carry complexity 0 and must never masquerade as real answers
+    complexity = result.get("complexity")
+    return isinstance(complexity, int) and complexity >= 1
+
+
+def _is_cacheable_substeps(result: CacheValue, language: Language) -> bool:
+    return CachedResult.of(result) != CachedResult.of(_offline_substeps(language))
+
+
+def _index_namespace(language: Language) -> str:
+    return f"{language}|{','.join(_get_model_chain())}"
+
+
+def _lookup_breakdown(key: str, goal: str, language: Language) -> Optional[CachedResult]:
+    cached = _breakdown_cache.get(key)
+    if cached is not None or _goal_index is None or not goal.strip():
+        return cached
+    match = _goal_index.query(_index_namespace(language), canonicalize(goal))
+    if match is None or match == key:
+        return None
+    cached = _breakdown_cache.get(match)
+    if cached is None:
+        # The cache evicted or expired the entry; drop it from the index as well
+        _goal_index.discard(match)
+    return cached
+
+
+def _store_breakdown(key: str, result: CacheValue, goal: str, language: Language) -> CachedResult:
+    # Fresh results are encoded once here, so misses and later hits share the same bytes
+    frozen = CachedResult.of(result)
+    if _is_cacheable_plan(frozen.data):
+        _breakdown_cache.set(key, frozen)
+        if _goal_index is not None:
+            _goal_index.add(_index_namespace(language), canonicalize(goal), key)
+    else:
+        _breakdown_cache.stats.incr("skipped")
+        metrics.FALLBACKS.inc(kind="breakdown")
+    return frozen
+
+
+def _store_sub_breakdown(key: str, result: CacheValue, language: Language) -> CachedResult:
+    frozen = CachedResult.of(result)
+    if _is_cacheable_substeps(frozen, language):
+        _sub_breakdown_cache.set(key, frozen)
+    else:
+        _sub_breakdown_cache.stats.incr("skipped")
+        metrics.FALLBACKS.inc(kind="sub_breakdown")
+    return frozen
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    near_duplicates = _goal_index.matches if _goal_index is not None else 0
+    return {
+        "breakdown": {**_breakdown_cache.stats.as_dict(), "size": len(_breakdown_cache), "near_duplicate_hits": near_duplicates},
+        "sub_breakdown": {**_sub_breakdown_cache.stats.as_dict(), "size": len(_sub_breakdown_cache)},
+    }
+
+
+def iter_cache_entries() -> Iterator[Tuple[str, str, CachedResult, Optional[float]]]:
+    for name, cache in (("breakdown", _breakdown_cache), ("sub_breakdown", _sub_breakdown_cache)):
+        for key, value, expires_at in cache.items():
+            yield name, key, value, expires_at
+
+
+def restore_cache_entry(name: str, key: str, value: CachedResult, expires_at: Optional[float]) -> bool:
+    # Entries keyed under another model chain could never be looked up again, so they are dropped
+    parts = key.split("|", 2)
+    if len(parts) != 3 or parts[0] not in ("en", "am") or parts[1] != ",".join(_get_model_chain()):
+        return False
+    language, _, text = parts
+    ttl = None
+    if expires_at is not None:
+        # Restored entries keep their original expiry rather than starting a fresh TTL
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return False
+    if name == "breakdown" and isinstance(value.data, Mapping) and _is_cacheable_plan(value.data):
+        _breakdown_cache.set(key, value, ttl)
+        if _goal_index is not None:
+            _goal_index.add(_index_namespace(language), text, key)
+        return True
+    if name == "sub_breakdown" and _is_cacheable_substeps(value, language):
+        _sub_breakdown_cache.set(key, value, ttl)
+        return True
+    return False
+
+
+def import_plan(goal: str, plan: Mapping[str, Any], language: str = "en") -> bool:
     normalized_language = _normalize_language(language)
-    guardrail = classify_goal(goal, client, _extract_response_text)
+    try:
+        valid = validate_plan(plan)
+    except ValueError:
+        return False
+    if not goal.strip():
+        return False
+    _store_breakdown(_cache_key(goal, normalized_language), valid, goal, normalized_language)
+    return True
+
+
+def _shared_context() -> contextvars.Context:
+    # Shared upstream work starts from a fresh context so the leader's deadline does not decide
+    # the answer for everyone who joins; only the rate-limit priority and call tally carry over
+    context = contextvars.Context()
+    context.run(ratelimit.request_priority.set, ratelimit.request_priority.get())
+    context.run(ratelimit.request_tally.set, ratelimit.request_tally.get())
+    context.run(deadline.request_deadline.set, deadline.shared_deadline())
+    return context
+
+
+class _SyncCall:
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _SingleFlight:
+    # Collapses concurrent misses for the same cache key into one upstream call
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._sync_calls: Dict[str, _SyncCall] = {}
+        self._async_calls: Dict[str, "asyncio.Task[Any]"] = {}
+        self._refs: Dict["asyncio.Task[Any]", int] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = _SyncCall()
+                self._sync_calls[key] = call
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            if not call.event.wait(deadline.remaining()):
+                raise DeadlineExceeded(f"request deadline reached waiting for shared {self.name} call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._sync_calls.pop(key, None)
+            call.event.set()
+
+    async def do_async(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._async_calls.get(key)
+            leader = task is None or task.done() or task.get_loop() is not loop
+            if leader:
+                task = loop.create_task(factory(), context=_shared_context())
+                self._async_calls[key] = task
+                task.add_done_callback(lambda done, _key=key: self._forget(_key, done))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+            self._refs[task] = self._refs.get(task, 0) + 1
+        try:
+            return await self._wait(task)
+        finally:
+            self._release(task)
+
+    async def do_many_async(
+        self, keys: List[str], factory: Callable[[List[str]], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        # Keys already in flight are joined; the rest are registered per key and computed by one
+        # factory(keys) call, so single-key callers can join a batch that covers their key
+        loop = asyncio.get_running_loop()
+        tasks: Dict[str, "asyncio.Task[Any]"] = {}
+        own: List[str] = []
+        with self._lock:
+            for key in keys:
+                task = self._async_calls.get(key)
+                if task is None or task.done() or task.get_loop() is not loop:
+                    own.append(key)
+                else:
+                    tasks[key] = task
+                    self.coalesced += 1
+            if own:
+                batch = loop.create_task(factory(own), context=_shared_context())
+                picks = [loop.create_task(self._pick(batch, key)) for key in own]
+                waiting = [len(picks)]
+
+                def settle(_: "asyncio.Task[Any]") -> None:
+                    # The shared call is dropped only once no key is waiting on it
+                    waiting[0] -= 1
+                    if not waiting[0] and not batch.done():
+                        batch.cancel()
+
+                for key, task in zip(own, picks):
+                    self._async_calls[key] = task
+                    task.add_done_callback(lambda done, _key=key: self._forget(_key, done))
+                    task.add_done_callback(settle)
+                    tasks[key] = task
+                self.leaders += 1
+            for task in tasks.values():
+                self._refs[task] = self._refs.get(task, 0) + 1
+        try:
+            return {key: await self._wait(task) for key, task in tasks.items()}
+        finally:
+            for task in tasks.values():
+                self._release(task)
+
+    @staticmethod
+    async def _pick(batch: "asyncio.Task[Dict[str, Any]]", key: str) -> Any:
+        return (await asyncio.shield(batch))[key]
+
+    async def _wait(self, task: "asyncio.Task[Any]") -> Any:
+        # Shielded so one cancelled caller does not cancel the shared upstream call; every caller,
+        # the leader included, stops waiting at its own deadline
+        return await _within_deadline(asyncio.shield(task), f"shared {self.name} call")
+
+    def _release(self, task: "asyncio.Task[Any]") -> None:
+        with self._lock:
+            remaining = self._refs[task] - 1
+            if remaining:
+                self._refs[task] = remaining
+            else:
+                del self._refs[task]
+        if not remaining and not task.done():
+            task.cancel()
+
+    def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+        with self._lock:
+            if self._async_calls.get(key) is task:
+                del self._async_calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._sync_calls) + len(self._async_calls),
+            }
+
+
+_breakdown_flight = _SingleFlight("breakdown")
+_sub_breakdown_flight = _SingleFlight("sub_breakdown")
+
+
+def singleflight_stats() -> Dict[str, Dict[str, int]]:
+    return {
+        "breakdown": _breakdown_flight.stats(),
+        "sub_breakdown": _sub_breakdown_flight.stats(),
+    }
+
+
+def _deadline_fallback(kind: str, exc: Exception, fallback: Any) -> Any:
+    # Offline results are never cached, so the next request with time to spare gets a live answer
+    logger.warning("Request deadline reached before a Gemini answer (%s); serving offline %s", exc, kind)
+    metrics.DEADLINE_FALLBACKS.inc(kind=kind)
+    return fallback
+
+
+def _compute_breakdown(goal: str, language: Language, combined: bool = False) -> Dict[str, Any]:
+    prompt = _build_combined_prompt(goal, language) if combined else _build_prompt(goal, language)
+    if not get_client():
+        return _offline_plan(goal, language)
+
+    try:
+        parser = lambda payload, _goal=goal, _lang=language: _safe_parse_response(payload, _goal, _lang, combined)
+        return _run_model_chain(prompt, parser, CallKind("combined" if combined else "breakdown", language))
+    except DeadlineExceeded as exc:
+        return _deadline_fallback("breakdown", exc, _offline_plan(goal, language))
+    except Exception:
+        logger.error("All Gemini models failed; returning offline fallback")
+        return _offline_plan(goal, language)
+
+
+async def _compute_breakdown_async(goal: str, language: Language, combined: bool = False) -> Dict[str, Any]:
+    prompt = _build_combined_prompt(goal, language) if combined else _build_prompt(goal, language)
+    if not get_client():
+        return _offline_plan(goal, language)
+
+    try:
+        parser = lambda payload, _goal=goal, _lang=language: _safe_parse_response(payload, _goal, _lang, combined)
+        return await _run_model_chain_async(prompt, parser, CallKind("combined" if combined else "breakdown", language))
+    except DeadlineExceeded as exc:
+        return _deadline_fallback("breakdown", exc, _offline_plan(goal, language))
+    except Exception:
+        logger.error("All Gemini models failed; returning offline fallback")
+        return _offline_plan(goal, language)
+
+
+def _generate_breakdown_cached(goal: str, language: Language) -> CachedResult:
+    key = _cache_key(goal, language)
+    cached = _lookup_breakdown(key, goal, language)
+    if cached is not None:
+        return cached
+    return _breakdown_flight.do(key, lambda: _compute_and_store_breakdown(key, goal, language))
+
+
+def _compute_and_store_breakdown(key: str, goal: str, language: Language) -> CachedResult:
+    return _store_breakdown(key, _compute_breakdown(goal, language), goal, language)
+
+
+async def _generate_breakdown_cached_async(goal: str, language: Language) -> CachedResult:
+    key = _cache_key(goal, language)
+    cached = _lookup_breakdown(key, goal, language)
+    if cached is not None:
+        return cached
+    return await _breakdown_flight.do_async(key, lambda: _compute_and_store_breakdown_async(key, goal, language))
+
+
+async def _compute_and_store_breakdown_async(key: str, goal: str, language: Language) -> CachedResult:
+    return _store_breakdown(key, await _compute_breakdown_async(goal, language), goal, language)
+
+
+def _guardrail_plan(guardrail: Dict[str, str], language: Language) -> Optional[Dict[str, Any]]:
     status = guardrail.get("status", "ok")
     if status == "gibberish":
         logger.info("Goal classified as gibberish: %s", guardrail.get("reason"))
-        return gibberish_plan(normalized_language, guardrail.get("reason"))
+        return gibberish_plan(language, guardrail.get("reason"))
     if status == "abuse":
         logger.info("Goal classified as abusive: %s", guardrail.get("reason"))
-        return abuse_plan(normalized_language, guardrail.get("reason"))
-    return copy.deepcopy(_generate_breakdown_cached(goal, normalized_language))
+        return abuse_plan(language, guardrail.get("reason"))
+    return None
 
 
-@lru_cache(maxsize=512)
-def _generate_sub_breakdown_cached(step: str, language: Language) -> Dict[str, Any]:
-    prompt = _build_sub_prompt(step, language)
-    if not client:
-        return _offline_substeps(language)
+def _use_combined_prompt() -> bool:
+    # Without a client the heuristic guardrail in classify_goal is the only check available
+    return GUARDRAIL_MODE == "combined" and bool(get_client())
+
+
+def _finish_combined(key: str, goal: str, language: Language, result: Dict[str, Any]) -> Tuple[str, CachedResult]:
+    if "status" not in result:
+        # Offline fallback: the model never judged this goal, so there is no verdict to keep
+        return "ok", _store_breakdown(key, result, goal, language)
+    verdict = remember_verdict(goal, {"status": result.pop("status"), "reason": result.pop("reason", "")})
+    if verdict["status"] != "ok":
+        return verdict["status"], CachedResult.of(result)
+    return "ok", _store_breakdown(key, result, goal, language)
+
+
+def _generate_breakdown_combined(goal: str, language: Language) -> Tuple[str, CachedResult]:
+    key = _cache_key(goal, language)
+    cached = _lookup_breakdown(key, goal, language)
+    if cached is not None:
+        return "ok", cached
+    return _breakdown_flight.do(
+        key, lambda: _finish_combined(key, goal, language, _compute_breakdown(goal, language, combined=True))
+    )
+
+
+async def _generate_breakdown_combined_async(goal: str, language: Language) -> Tuple[str, CachedResult]:
+    key = _cache_key(goal, language)
+    cached = _lookup_breakdown(key, goal, language)
+    if cached is not None:
+        return "ok", cached
+
+    async def compute() -> Tuple[str, CachedResult]:
+        return _finish_combined(key, goal, language, await _compute_breakdown_async(goal, language, combined=True))
+
+    return await _breakdown_flight.do_async(key, compute)
+
+
+def generate_breakdown(goal: str, language: str = "en") -> Dict[str, Any]:
+    normalized_language = _normalize_language(language)
+    try:
+        return _generate_breakdown(goal, normalized_language)
+    except DeadlineExceeded as exc:
+        return _deadline_fallback("breakdown", exc, _offline_plan(goal, normalized_language))
+
+
+def _generate_breakdown(goal: str, normalized_language: Language) -> Dict[str, Any]:
+    if _use_combined_prompt():
+        verdict = pre_classify(goal)
+        flagged = _guardrail_plan(verdict, normalized_language) if verdict is not None else None
+        if flagged is not None:
+            return flagged
+        return _generate_breakdown_combined(goal, normalized_language)[1].to_dict()
+    guardrail = classify_goal(goal, get_client(), _extract_response_text)
+    flagged = _guardrail_plan(guardrail, normalized_language)
+    if flagged is not None:
+        return flagged
+    return _generate_breakdown_cached(goal, normalized_language).to_dict()
+
+
+async def generate_breakdown_async(goal: str, language: str = "en") -> Dict[str, Any]:
+    return (await generate_breakdown_result_async(goal, language)).to_dict()
+
+
+async def generate_breakdown_result_async(goal: str, language: str = "en") -> CachedResult:
+    # Shared, read-only result with its pre-encoded JSON body; callers must not mutate it
+    _, result = await _generate_breakdown_status_async(goal, _normalize_language(language))
+    return result
+
+
+async def _generate_breakdown_status_async(goal: str, normalized_language: Language) -> Tuple[str, CachedResult]:
+    # The guardrail status travels with the plan so callers can tell flagged plans from real ones
+    try:
+        return await _generate_breakdown_result_async(goal, normalized_language)
+    except DeadlineExceeded as exc:
+        return "ok", CachedResult.of(_deadline_fallback("breakdown", exc, _offline_plan(goal, normalized_language)))
+
+
+async def _generate_breakdown_result_async(goal: str, normalized_language: Language) -> Tuple[str, CachedResult]:
+    _shed_prefetch_if_pressured()
+    if _use_combined_prompt():
+        # Local tier and verdict cache still answer obvious goals without any call
+        verdict = pre_classify(goal)
+        flagged = _guardrail_plan(verdict, normalized_language) if verdict is not None else None
+        if flagged is not None:
+            return verdict["status"], CachedResult.of(flagged)
+        status, result = await _generate_breakdown_combined_async(goal, normalized_language)
+        if status == "ok":
+            _schedule_prefetch(result.data, normalized_language)
+        return status, result
+    if SPECULATIVE_GUARDRAIL:
+        return await _generate_breakdown_speculative(goal, normalized_language)
+    guardrail = await classify_goal_async(goal, get_client(), _extract_response_text)
+    flagged = _guardrail_plan(guardrail, normalized_language)
+    if flagged is not None:
+        return guardrail["status"], CachedResult.of(flagged)
+    result = await _generate_breakdown_cached_async(goal, normalized_language)
+    _schedule_prefetch(result.data, normalized_language)
+    return "ok", result
+
+
+_speculation_counts = {"used": 0, "discarded": 0}
+
+
+def speculation_stats() -> Dict[str, int]:
+    return dict(_speculation_counts)
+
+
+def _discard_task(task: "asyncio.Future[Any]") -> None:
+    task.cancel()
+    if task.done() and not task.cancelled():
+        # Retrieve the outcome so a failed speculative plan does not log as unhandled
+        task.exception()
+
+
+async def _compute_frozen_breakdown_async(goal: str, language: Language) -> CachedResult:
+    return CachedResult.of(await _compute_breakdown_async(goal, language))
+
+
+async def _generate_breakdown_speculative(goal: str, language: Language) -> Tuple[str, CachedResult]:
+    key = _cache_key(goal, language)
+    cached = _lookup_breakdown(key, goal, language) if goal.strip() else None
+    if cached is not None:
+        guardrail = await classify_goal_async(goal, get_client(), _extract_response_text)
+        flagged = _guardrail_plan(guardrail, language)
+        if flagged is not None:
+            return guardrail["status"], CachedResult.of(flagged)
+        _schedule_prefetch(cached.data, language)
+        return "ok", cached
+
+    # The plan is only written to the cache once the guardrail has cleared the goal
+    plan_task = asyncio.ensure_future(
+        _breakdown_flight.do_async(key, lambda: _compute_frozen_breakdown_async(goal, language))
+    )
+    try:
+        guardrail = await classify_goal_async(goal, get_client(), _extract_response_text)
+    except BaseException:
+        _discard_task(plan_task)
+        raise
+    flagged = _guardrail_plan(guardrail, language)
+    if flagged is not None:
+        _discard_task(plan_task)
+        _speculation_counts["discarded"] += 1
+        return guardrail["status"], CachedResult.of(flagged)
+    result = _store_breakdown(key, await plan_task, goal, language)
+    _speculation_counts["used"] += 1
+    _schedule_prefetch(result.data, language)
+    return "ok", result
+
 
-    for model in _get_model_chain():
+_STEPS_ARRAY_PATTERN = re.compile(r'"steps"\s*:\s*\[')
+_JSON_DECODER = json.JSONDecoder()
+
+
+class _IncrementalPlanParser:
+    # Pulls each finished step string out of a partially streamed plan payload
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.steps: List[str] = []
+        self._pos: Optional[int] = None
+        self._closed = False
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        if self._pos is None:
+            match = _STEPS_ARRAY_PATTERN.search(self.buffer)
+            if match:
+                self._pos = match.end()
+        fresh: List[str] = []
+        while self._pos is not None and not self._closed and len(self.steps) < 5:
+            pos = self._pos
+            while pos < len(self.buffer) and self.buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(self.buffer):
+                break
+            if self.buffer[pos] != '"':
+                # "]" ends the array; anything else is malformed and left to final validation
+                self._closed = True
+                break
+            try:
+                value, end = _JSON_DECODER.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                break
+            self._pos = end
+            if isinstance(value, str) and value.strip():
+                self.steps.append(value)
+                fresh.append(value)
+        return fresh
+
+
+def _chunk_text(chunk: Any) -> str:
+    try:
+        return _extract_response_text(chunk)
+    except ValueError:
+        return ""
+
+
+async def _stream_model_text(model: str, prompt: str, language: Language) -> AsyncIterator[str]:
+    # Steps reach the client as they arrive, so a cut-off stream cannot be retried; keep the static limit
+    await ratelimit.acquire(model, prompt, MAX_OUTPUT_TOKENS)
+    with _UpstreamCall(model, CallKind("breakdown", language)) as call:
+        stream = await get_client().aio.models.generate_content_stream(
+            model=model,
+            contents=prompt,
+            config=_build_generation_config(),
+        )
+        async for chunk in stream:
+            # Usage metadata arrives on the final chunk
+            call.response = chunk
+            text = _chunk_text(chunk)
+            if text:
+                yield text
+
+
+def _plan_events(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    events: List[Dict[str, Any]] = [
+        {"event": "step", "data": {"index": index, "step": step}} for index, step in enumerate(plan["steps"])
+    ]
+    events.append({"event": "complexity", "data": {"complexity": plan["complexity"]}})
+    events.append({"event": "done", "data": plan})
+    return events
+
+
+async def stream_breakdown_async(goal: str, language: str = "en") -> AsyncIterator[Dict[str, Any]]:
+    normalized_language = _normalize_language(language)
+    guardrail = await classify_goal_async(goal, get_client(), _extract_response_text)
+    flagged = _guardrail_plan(guardrail, normalized_language)
+    if flagged is not None:
+        for event in _plan_events(flagged):
+            yield event
+        return
+
+    key = _cache_key(goal, normalized_language)
+    cached = _lookup_breakdown(key, goal, normalized_language)
+    if cached is not None:
+        for event in _plan_events(cached.to_dict()):
+            yield event
+        return
+
+    prompt = _build_prompt(goal, normalized_language)
+    if not get_client():
+        for event in _plan_events(_offline_plan(goal, normalized_language)):
+            yield event
+        return
+
+    parser = _IncrementalPlanParser()
+    for model in route_models(_get_model_chain()):
+        parser = _IncrementalPlanParser()
         try:
-            parser = lambda payload, _lang=language: _safe_parse_sub_response(payload, _lang)
-            result = _call_model(model, prompt, parser)
-            return result
-        except Exception:
+            async for text in _stream_model_text(model, prompt, normalized_language):
+                for step in parser.feed(text):
+                    yield {"event": "step", "data": {"index": len(parser.steps) - 1, "step": step}}
+            break
+        except Exception as exc:
+            if parser.steps:
+                # Steps already reached the client, so the stream cannot switch models mid-flight
+                logger.warning("Gemini stream on %s broke after %s steps: %s", model, len(parser.steps), exc)
+                break
+            logger.info("Model %s stream failed with %s; attempting next fallback", model, exc)
             continue
-    return _offline_substeps(language)
+
+    # Final validation is authoritative: malformed streams resolve to the offline plan
+    if parser.buffer:
+        result = _safe_parse_response(parser.buffer, goal, normalized_language)
+    else:
+        result = _offline_plan(goal, normalized_language)
+    _store_breakdown(key, result, goal, normalized_language)
+    yield {"event": "complexity", "data": {"complexity": result["complexity"]}}
+    yield {"event": "done", "data": result}
+
+
+def _compute_sub_breakdown(step: str, language: Language) -> Dict[str, Any]:
+    prompt = _build_sub_prompt(step, language)
+    if not get_client():
+        return _offline_substeps(language)
+
+    try:
+        parser = lambda payload, _lang=language: _safe_parse_sub_response(payload, _lang)
+        return _run_model_chain(prompt, parser, CallKind("sub_breakdown", language))
+    except DeadlineExceeded as exc:
+        return _deadline_fallback("sub_breakdown", exc, _offline_substeps(language))
+    except Exception:
+        return _offline_substeps(language)
+
+
+async def _compute_sub_breakdown_async(step: str, language: Language) -> Dict[str, Any]:
+    prompt = _build_sub_prompt(step, language)
+    if not get_client():
+        return _offline_substeps(language)
+
+    try:
+        parser = lambda payload, _lang=language: _safe_parse_sub_response(payload, _lang)
+        return await _run_model_chain_async(prompt, parser, CallKind("sub_breakdown", language))
+    except DeadlineExceeded as exc:
+        return _deadline_fallback("sub_breakdown", exc, _offline_substeps(language))
+    except Exception:
+        return _offline_substeps(language)
+
+
+def _generate_sub_breakdown_cached(step: str, language: Language) -> CachedResult:
+    key = _cache_key(step, language)
+    cached = _sub_breakdown_cache.get(key)
+    if cached is not None:
+        return cached
+    return _sub_breakdown_flight.do(key, lambda: _compute_and_store_sub_breakdown(key, step, language))
+
+
+def _compute_and_store_sub_breakdown(key: str, step: str, language: Language) -> CachedResult:
+    return _store_sub_breakdown(key, _compute_sub_breakdown(step, language), language)
+
+
+async def _generate_sub_breakdown_cached_async(step: str, language: Language) -> CachedResult:
+    key = _cache_key(step, language)
+    cached = _sub_breakdown_cache.get(key)
+    if cached is not None:
+        return cached
+    return await _sub_breakdown_flight.do_async(
+        key, lambda: _compute_and_store_sub_breakdown_async(key, step, language)
+    )
+
+
+async def _compute_and_store_sub_breakdown_async(key: str, step: str, language: Language) -> CachedResult:
+    return _store_sub_breakdown(key, await _compute_sub_breakdown_async(step, language), language)
 
 
 def _build_sub_prompt(step: str, language: Language) -> str:
@@ -306,4 +1238,376 @@ When responding, keep the JSON schema identical but write each substep in modern
 
 def generate_sub_breakdown(step: str, language: str = "en") -> Dict[str, Any]:
     normalized_language = _normalize_language(language)
-    return copy.deepcopy(_generate_sub_breakdown_cached(step, normalized_language))
+    with use_priority(PRIORITY_SUB_BREAKDOWN):
+        try:
+            return _generate_sub_breakdown_cached(step, normalized_language).to_dict()
+        except DeadlineExceeded as exc:
+            return _deadline_fallback("sub_breakdown", exc, _offline_substeps(normalized_language))
+
+
+async def generate_sub_breakdown_async(step: str, language: str = "en") -> Dict[str, Any]:
+    return (await generate_sub_breakdown_result_async(step, language)).to_dict()
+
+
+async def generate_sub_breakdown_result_async(step: str, language: str = "en") -> CachedResult:
+    normalized_language = _normalize_language(language)
+    with use_priority(PRIORITY_SUB_BREAKDOWN):
+        try:
+            return await _generate_sub_breakdown_cached_async(step, normalized_language)
+        except DeadlineExceeded as exc:
+            return CachedResult.of(_deadline_fallback("sub_breakdown", exc, _offline_substeps(normalized_language)))
+
+
+def _build_batch_sub_prompt(steps: List[str], language: Language) -> str:
+    listing = "\n".join(f'{index}. "{step}"' for index, step in enumerate(steps, start=1))
+    prompt = f"""
+Break each of the following {len(steps)} steps into 3 tactical sub-actions.
+Steps:
+{listing}
+Return only JSON with exactly {len(steps)} items, in the same order as the steps:
+{{ "items": [ {{ "substeps": ["sub1", "sub2", "sub3"] }} ] }}
+Tone: Dark, technical, concise (max 12 words per substep).
+"""
+    if language == "am":
+        prompt += "When responding, keep the JSON schema identical but write each substep in modern Amharic while preserving the same concise tone.\n"
+    return prompt
+
+
+def _safe_parse_batch_sub_response(payload: str, count: int, language: Language) -> Dict[str, Any]:
+    # Validates item by item so one malformed entry only costs that step its live answer
+    try:
+        data = json.loads(payload)
+        items = data.get("items") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise ValueError("Missing items list")
+    except Exception as exc:
+        logger.error("Failed to parse Gemini batch sub-response: %s", exc)
+        items = []
+    parsed: List[Dict[str, Any]] = []
+    for index in range(count):
+        item = items[index] if index < len(items) else None
+        substeps = item.get("substeps") if isinstance(item, dict) else None
+        if isinstance(substeps, list) and substeps and all(isinstance(s, str) and s.strip() for s in substeps):
+            parsed.append({"substeps": [str(s) for s in substeps[:3]]})
+        else:
+            logger.error("Gemini batch sub-response item %s invalid; using offline substeps", index)
+            parsed.append(_offline_substeps(language))
+    return {"items": parsed}
+
+
+async def _compute_sub_breakdown_batch_async(steps: List[str], language: Language) -> List[Dict[str, Any]]:
+    if not get_client():
+        return [_offline_substeps(language) for _ in steps]
+
+    prompt = _build_batch_sub_prompt(steps, language)
+    try:
+        parser = lambda payload, _count=len(steps), _lang=language: _safe_parse_batch_sub_response(payload, _count, _lang)
+        result = await _run_model_chain_async(prompt, parser, CallKind("batch_sub_breakdown", language, len(steps)))
+        return result["items"]
+    except DeadlineExceeded as exc:
+        return _deadline_fallback("sub_breakdown", exc, [_offline_substeps(language) for _ in steps])
+    except Exception:
+        return [_offline_substeps(language) for _ in steps]
+
+
+async def generate_sub_breakdown_batch_async(steps: List[str], language: str = "en") -> List[Dict[str, Any]]:
+    with use_priority(PRIORITY_SUB_BREAKDOWN):
+        return await _generate_sub_breakdown_batch_async(steps, _normalize_language(language))
+
+
+async def _generate_sub_breakdown_batch_async(steps: List[str], normalized_language: Language) -> List[Dict[str, Any]]:
+    resolved: Dict[str, CachedResult] = {}
+    misses: Dict[str, str] = {}
+    for step in steps:
+        key = _cache_key(step, normalized_language)
+        if key in resolved or key in misses:
+            continue
+        cached = _sub_breakdown_cache.get(key)
+        if cached is not None:
+            resolved[key] = cached
+        else:
+            misses[key] = step
+
+    if len(misses) == 1:
+        ((key, step),) = misses.items()
+        try:
+            resolved[key] = await _generate_sub_breakdown_cached_async(step, normalized_language)
+        except DeadlineExceeded as exc:
+            resolved[key] = CachedResult.of(_deadline_fallback("sub_breakdown", exc, _offline_substeps(normalized_language)))
+    elif misses:
+
+        async def expand(keys: List[str]) -> Dict[str, CachedResult]:
+            # One combined prompt expands every uncached step not already being expanded elsewhere
+            expanded = await _compute_sub_breakdown_batch_async([misses[key] for key in keys], normalized_language)
+            return {key: _store_sub_breakdown(key, result, normalized_language) for key, result in zip(keys, expanded)}
+
+        try:
+            resolved.update(await _sub_breakdown_flight.do_many_async(list(misses), expand))
+        except DeadlineExceeded as exc:
+            offline = CachedResult.of(_deadline_fallback("sub_breakdown", exc, _offline_substeps(normalized_language)))
+            resolved.update({key: offline for key in misses})
+
+    return [{"step": step, **resolved[_cache_key(step, normalized_language)].to_dict()} for step in steps]
+
+
+_TREE_GROUP_DONE = object()
+
+
+async def stream_breakdown_tree_async(
+    goal: str, language: str = "en", depth: int = 2, budget: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    # Depth 1 is the plan alone; every further level expands each node's children with one
+    # batched call per sibling group. The budget counts every upstream attempt made for the tree
+    # (guardrail, plan, retries, fallbacks); cached groups are free and expansion stops once it is spent.
+    normalized_language = _normalize_language(language)
+    depth = max(1, min(depth, TREE_MAX_DEPTH))
+    budget = TREE_CALL_BUDGET if budget is None else max(0, min(budget, TREE_CALL_BUDGET))
+    tally = ratelimit.CallTally()
+    # Work runs in tasks carrying the tally; a context variable set inside this generator would leak into the consumer
+    tree_context = contextvars.copy_context()
+    tree_context.run(ratelimit.request_tally.set, tally)
+    loop = asyncio.get_running_loop()
+    status, plan = await loop.create_task(
+        _generate_breakdown_status_async(goal, normalized_language), context=tree_context.copy()
+    )
+    yield {"event": "plan", "data": plan.to_dict()}
+
+    counts = {"nodes": 0, "truncated": 0}
+    expanding = 0
+    queue: "asyncio.Queue[Any]" = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, TREE_CONCURRENCY))
+    tasks: "set[asyncio.Task[None]]" = set()
+    outstanding = 0
+
+    def node(node_id: str, parent: str, level: int, step: str, substeps: List[str], truncated: bool) -> Dict[str, Any]:
+        data = {"id": node_id, "parent": parent or None, "depth": level, "step": step, "substeps": substeps}
+        if truncated:
+            data["truncated"] = True
+        return {"event": "node", "data": data}
+
+    async def expand(parent: str, steps: List[str], level: int) -> None:
+        nonlocal expanding
+        ids = [f"{parent}.{index}" if parent else str(index) for index in range(1, len(steps) + 1)]
+        async with semaphore:
+            misses = any(not _sub_breakdown_cache.contains(_cache_key(step, normalized_language)) for step in steps)
+            # Groups still in flight hold one call each, so parallel groups cannot all slip under the budget
+            if misses and tally.count + expanding >= budget:
+                counts["truncated"] += len(steps)
+                for node_id, step in zip(ids, steps):
+                    queue.put_nowait(node(node_id, parent, level, step, [], True))
+                return
+            expanding += misses
+            try:
+                with use_priority(PRIORITY_SUB_BREAKDOWN):
+                    expanded = await _generate_sub_breakdown_batch_async(steps, normalized_language)
+            finally:
+                expanding -= misses
+        for node_id, item in zip(ids, expanded):
+            substeps = list(item["substeps"])
+            queue.put_nowait(node(node_id, parent, level, item["step"], substeps, False))
+            # Offline fallbacks are generic, so expanding them further would only spend budget
+            if level < depth - 1 and _is_cacheable_substeps({"substeps": substeps}, normalized_language):
+                schedule(node_id, substeps, level + 1)
+
+    async def run(parent: str, steps: List[str], level: int) -> None:
+        try:
+            await expand(parent, steps, level)
+        except Exception as exc:
+            logger.warning("Tree expansion under %r failed: %s", parent or "root", exc)
+        finally:
+            queue.put_nowait(_TREE_GROUP_DONE)
+
+    def schedule(parent: str, steps: List[str], level: int) -> None:
+        nonlocal outstanding
+        outstanding += 1
+        task = loop.create_task(run(parent, steps, level), context=tree_context.copy())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    steps = list(plan.data.get("steps") or [])
+    # Flagged and offline plans are returned as-is rather than expanded
+    if depth > 1 and steps and status == "ok" and _is_cacheable_plan(plan.data):
+        schedule("", steps, 1)
+    try:
+        while outstanding:
+            item = await queue.get()
+            if item is _TREE_GROUP_DONE:
+                outstanding -= 1
+                continue
+            counts["nodes"] += 1
+            yield item
+    finally:
+        # A disconnected client stops the generator; do not keep spending calls on its behalf
+        for task in list(tasks):
+            task.cancel()
+    yield {"event": "done", "data": {**counts, "calls": tally.count, "budget": budget, "depth": depth}}
+
+
+_prefetch_tasks: "set[asyncio.Task[None]]" = set()
+_prefetch_calls: "deque[float]" = deque()
+_prefetch_semaphore: Optional[asyncio.Semaphore] = None
+_prefetch_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+_prefetch_counts = {"scheduled": 0, "completed": 0, "failed": 0, "cancelled": 0, "skipped_budget": 0, "skipped_pressure": 0}
+
+
+def prefetch_stats() -> Dict[str, int]:
+    return {**_prefetch_counts, "pending": len(_prefetch_tasks)}
+
+
+def _under_pressure() -> bool:
+    in_flight = sum(flight.stats()["in_flight"] for flight in (_breakdown_flight, _sub_breakdown_flight))
+    return in_flight >= PREFETCH_PRESSURE_INFLIGHT
+
+
+def _shed_prefetch_if_pressured() -> None:
+    # Interactive traffic always wins: drop background work the moment upstream load spikes
+    if not _prefetch_tasks or not _under_pressure():
+        return
+    for task in list(_prefetch_tasks):
+        task.cancel()
+
+
+def _take_prefetch_budget() -> bool:
+    now = time.monotonic()
+    while _prefetch_calls and now - _prefetch_calls[0] >= 60.0:
+        _prefetch_calls.popleft()
+    if len(_prefetch_calls) >= PREFETCH_CALLS_PER_MINUTE:
+        return False
+    _prefetch_calls.append(now)
+    return True
+
+
+def _get_prefetch_semaphore() -> asyncio.Semaphore:
+    global _prefetch_semaphore, _prefetch_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _prefetch_semaphore is None or _prefetch_semaphore_loop is not loop:
+        _prefetch_semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+        _prefetch_semaphore_loop = loop
+    return _prefetch_semaphore
+
+
+def _schedule_prefetch(plan: Mapping[str, Any], language: Language) -> None:
+    if not PREFETCH_SUBSTEPS or not get_client() or not _is_cacheable_plan(plan):
+        return
+    steps = list(plan.get("steps") or [])
+    if all(_sub_breakdown_cache.contains(_cache_key(step, language)) for step in steps):
+        return
+    if _under_pressure():
+        _prefetch_counts["skipped_pressure"] += 1
+        return
+    # A fresh context: background work must not inherit the triggering request's deadline
+    task = asyncio.get_running_loop().create_task(_prefetch_substeps(steps, language), context=contextvars.Context())
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_finish_prefetch)
+    _prefetch_counts["scheduled"] += 1
+
+
+async def _prefetch_substeps(steps: List[str], language: Language) -> None:
+    async with _get_prefetch_semaphore():
+        if _under_pressure():
+            _prefetch_counts["skipped_pressure"] += 1
+            return
+        if not _take_prefetch_budget():
+            _prefetch_counts["skipped_budget"] += 1
+            return
+        with use_priority(PRIORITY_PREFETCH):
+            await generate_sub_breakdown_batch_async(steps, language)
+
+
+def _finish_prefetch(task: "asyncio.Task[None]") -> None:
+    _prefetch_tasks.discard(task)
+    if task.cancelled():
+        _prefetch_counts["cancelled"] += 1
+    elif task.exception() is not None:
+        _prefetch_counts["failed"] += 1
+        logger.warning("Substep prefetch failed: %s", task.exception())
+    else:
+        _prefetch_counts["completed"] += 1
+
+
+def _prepare_client() -> None:
+    started = time.perf_counter()
+    try:
+        get_client()
+        _build_generation_config()
+    except Exception as exc:
+        logger.warning("Background client warm-up failed: %s", exc)
+        return
+    logger.info("Background client warm-up finished in %.1fms", (time.perf_counter() - started) * 1000.0)
+
+
+def start_background_warm_up() -> "Optional[asyncio.Task[None]]":
+    # Off the event loop, so neither startup nor the first request waits for the SDK import;
+    # skipped when STARTUP_WARMUP already prepares the client before serving
+    if not BACKGROUND_CLIENT_WARMUP or WARMUP_TARGETS & {"client", "connection"}:
+        return None
+    return asyncio.get_running_loop().create_task(asyncio.to_thread(_prepare_client))
+
+
+async def warm_up(targets: Optional[set] = None) -> Dict[str, float]:
+    # Never fatal: a failed warm-up only means the first request pays the cost instead
+    targets = WARMUP_TARGETS if targets is None else targets
+    timings: Dict[str, float] = {}
+    if targets & {"client", "connection"}:
+        started = time.perf_counter()
+        get_client()
+        _build_generation_config()
+        timings["client"] = (time.perf_counter() - started) * 1000.0
+    if "connection" in targets and get_client():
+        started = time.perf_counter()
+        try:
+            # A metadata lookup opens the HTTPS connection without spending generation quota
+            await asyncio.wait_for(get_client().aio.models.get(model=_get_model_chain()[0]), WARMUP_TIMEOUT_SECONDS)
+        except Exception as exc:
+            logger.warning("Connection warm-up failed: %s", exc)
+        timings["connection"] = (time.perf_counter() - started) * 1000.0
+    if "cache" in targets:
+        started = time.perf_counter()
+        # Opens SQLite connections and loads the Unicode tables canonicalization needs
+        len(_breakdown_cache)
+        len(_sub_breakdown_cache)
+        canonicalize("warm up ሰላም")
+        timings["cache"] = (time.perf_counter() - started) * 1000.0
+    if timings:
+        logger.info("Startup warm-up finished: %s", {name: round(ms, 1) for name, ms in timings.items()})
+    return timings
+
+
+def _collect_metrics() -> Iterator[Tuple[str, str, str, Dict[str, str], float]]:
+    for cache, stats in cache_stats().items():
+        labels = {"cache": cache}
+        for field in ("hits", "misses", "evictions", "expirations"):
+            yield f"ignition_cache_{field}_total", "counter", f"Result cache {field}.", labels, stats[field]
+        yield "ignition_cache_entries", "gauge", "Entries currently cached.", labels, stats["size"]
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups if lookups else 0.0
+        yield "ignition_cache_hit_ratio", "gauge", "Hit ratio since process start.", labels, ratio
+    for flight, stats in singleflight_stats().items():
+        labels = {"flight": flight}
+        yield "ignition_singleflight_coalesced_total", "counter", "Requests that joined an in-flight call.", labels, stats["coalesced"]
+        yield "ignition_singleflight_in_flight", "gauge", "Distinct upstream computations in flight.", labels, stats["in_flight"]
+    for outcome, value in speculation_stats().items():
+        yield "ignition_speculative_plans_total", "counter", "Speculative plans used or discarded.", {"outcome": outcome}, value
+    for outcome, value in prefetch_stats().items():
+        if outcome == "pending":
+            yield "ignition_prefetch_pending", "gauge", "Substep prefetches currently running.", {}, value
+            continue
+        yield "ignition_prefetch_total", "counter", "Substep prefetch outcomes.", {"outcome": outcome}, value
+    for model, snapshot in circuit_stats().items():
+        yield "ignition_circuit_open", "gauge", "1 when the model circuit is not closed.", {"model": model}, float(snapshot["state"] != "closed")
+        yield "ignition_circuit_error_rate", "gauge", "Rolling error rate per model.", {"model": model}, snapshot["error_rate"]
+    for model, snapshot in ratelimit.limiter_stats().items():
+        yield "ignition_ratelimit_rejected_total", "counter", "Calls rejected by the local limiter.", {"model": model}, snapshot["rejected"]
+        yield "ignition_ratelimit_queue_depth", "gauge", "Calls waiting for local quota.", {"model": model}, snapshot["queue_depth"]
+    for name, value in guardrail_stats().items():
+        if name == "cache_size":
+            continue
+        tier, _, status = name.partition("_")
+        yield "ignition_guardrail_verdicts_total", "counter", "Guardrail verdicts by tier.", {"tier": tier, "status": status}, value
+    for name, stats in budget.budget_stats(MAX_OUTPUT_TOKENS).items():
+        endpoint, _, language = name.partition("/")
+        labels = {"endpoint": endpoint, "language": language}
+        yield "ignition_output_budget_tokens", "gauge", "Output token limit per item currently granted.", labels, stats["limit"]
+
+
+metrics.REGISTRY.register_collector(_collect_metrics)
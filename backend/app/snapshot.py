@@ -0,0 +1,253 @@
+"""Save, restore and seed the result caches.
+
+    RESULT_CACHE_BACKEND=sqlite python -m app.snapshot dump cache.ndjson.gz
+    RESULT_CACHE_BACKEND=sqlite python -m app.snapshot load cache.ndjson.gz
+    python -m app.snapshot import goals.ndjson --output cache.ndjson.gz
+
+Snapshots are gzip-compressed NDJSON: a header line, then one cache entry per line with
+the stored JSON body embedded as-is. History imports read the frontend's `Goal` export
+(`original`, `steps`, `complexity`, `createdAt`) as a JSON array or NDJSON, streaming it
+and keeping only the newest entries that fit in the breakdown cache.
+"""
+import argparse
+import datetime
+import gzip
+import heapq
+import json
+import logging
+import os
+import re
+import sys
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from app import env_flag, services
+from app.cache import CACHE_BACKEND, CachedResult
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "ignition-cache"
+VERSION = 1
+SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "")
+SAVE_ON_SHUTDOWN = env_flag("CACHE_SNAPSHOT_ON_SHUTDOWN")
+_CHUNK_CHARS = 64 * 1024
+_ETHIOPIC = re.compile(r"[ሀ-᎟ⶀ-⷟꬀-꬯]")
+
+
+def _open_text(path: str, mode: str) -> IO[str]:
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def dump(path: str) -> Dict[str, int]:
+    counts = {"breakdown": 0, "sub_breakdown": 0}
+    temporary = f"{path}.tmp"
+    with gzip.open(temporary, "wb") as out:
+        header = {"format": FORMAT, "version": VERSION, "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+        out.write(json.dumps(header).encode("utf-8") + b"\n")
+        for name, key, value, expires_at in services.iter_cache_entries():
+            # Bodies are already compact JSON, so they are spliced in without re-encoding
+            prefix = json.dumps(
+                {"cache": name, "key": key, "expires_at": expires_at}, ensure_ascii=False, separators=(",", ":")
+            )[:-1]
+            out.write(prefix.encode("utf-8") + b',"value":' + value.body + b"}\n")
+            counts[name] += 1
+    # Readers never see a half-written snapshot
+    os.replace(temporary, path)
+    logger.info("Cache snapshot written to %s: %s", path, counts)
+    return counts
+
+
+def load(path: str) -> Dict[str, int]:
+    counts = {"breakdown": 0, "sub_breakdown": 0, "skipped": 0}
+    with gzip.open(path, "rt", encoding="utf-8") as stream:
+        header = json.loads(stream.readline() or "{}")
+        if header.get("format") != FORMAT or header.get("version") != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} cache snapshot")
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                value = CachedResult.of(entry["value"])
+                restored = services.restore_cache_entry(entry["cache"], entry["key"], value, entry.get("expires_at"))
+            except (ValueError, KeyError, TypeError) as exc:
+                logger.warning("Skipping unreadable snapshot entry: %s", exc)
+                restored = False
+            if restored:
+                counts[entry["cache"]] += 1
+            else:
+                counts["skipped"] += 1
+    logger.info("Cache snapshot loaded from %s: %s", path, counts)
+    return counts
+
+
+def _iter_records(stream: IO[str]) -> Iterator[Any]:
+    # Accepts a top-level JSON array or NDJSON without reading the whole input
+    decoder = json.JSONDecoder()
+    buffer = stream.read(_CHUNK_CHARS)
+    position = 0
+    eof = not buffer
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        chunk = "" if eof else stream.read(_CHUNK_CHARS)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+        return not eof
+
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position < len(buffer) or not fill():
+            break
+    array = buffer[position:position + 1] == "["
+    if array:
+        position += 1
+    while True:
+        while position < len(buffer) and (buffer[position].isspace() or (array and buffer[position] == ",")):
+            position += 1
+        if position >= len(buffer):
+            if fill():
+                continue
+            return
+        if array and buffer[position] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if fill():
+                continue
+            raise
+        position = end
+        yield record
+
+
+def _parse_time(raw: Any) -> float:
+    if isinstance(raw, (int, float)):
+        # Epoch milliseconds, as JavaScript exports dates
+        return float(raw) / 1000.0
+    if isinstance(raw, str):
+        try:
+            return datetime.datetime.fromisoformat(raw.strip().replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return 0.0
+
+
+def _history_plan(record: Any, language: Optional[str]) -> Optional[Tuple[str, Dict[str, Any], str]]:
+    if not isinstance(record, dict):
+        return None
+    goal = record.get("original")
+    steps = record.get("steps")
+    if isinstance(steps, str):
+        # Some database exports keep the Json column as an encoded string
+        try:
+            steps = json.loads(steps)
+        except ValueError:
+            return None
+    if not isinstance(goal, str) or not goal.strip():
+        return None
+    try:
+        # Offline fallbacks (complexity 0) and malformed rows must not take the place of real plans
+        plan = services.validate_plan({"steps": steps, "complexity": record.get("complexity")})
+    except ValueError:
+        return None
+    if language is None:
+        # The Goal table does not record the language; Ethiopic script means the plan was Amharic
+        language = "am" if _ETHIOPIC.search(goal) or _ETHIOPIC.search(plan["steps"][0]) else "en"
+    return goal, plan, language
+
+
+def import_history(stream: IO[str], language: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, int]:
+    # Only the newest `limit` goals are held at once; older ones would be evicted on insert anyway
+    limit = services.BREAKDOWN_CACHE_SIZE if limit is None else limit
+    counts = {"read": 0, "imported": 0, "skipped": 0}
+    newest: List[Tuple[float, int, str, Dict[str, Any], str]] = []
+    for sequence, record in enumerate(_iter_records(stream)):
+        counts["read"] += 1
+        parsed = _history_plan(record, language)
+        if parsed is None:
+            counts["skipped"] += 1
+            continue
+        entry = (_parse_time(record.get("createdAt")), sequence, *parsed)
+        if len(newest) < limit:
+            heapq.heappush(newest, entry)
+        elif limit > 0 and entry[:2] > newest[0][:2]:
+            heapq.heapreplace(newest, entry)
+            counts["skipped"] += 1
+        else:
+            counts["skipped"] += 1
+    # Oldest first, so the most recent goals end up most recently used and survive eviction longest
+    for _, _, goal, plan, plan_language in sorted(newest, key=lambda item: item[:2]):
+        if services.import_plan(goal, plan, plan_language):
+            counts["imported"] += 1
+        else:
+            counts["skipped"] += 1
+    logger.info("History import finished: %s", counts)
+    return counts
+
+
+def restore_on_startup() -> Optional[Dict[str, int]]:
+    # Never fatal: a missing or unreadable snapshot only means a cold cache
+    if not SNAPSHOT_PATH or not os.path.exists(SNAPSHOT_PATH):
+        return None
+    try:
+        return load(SNAPSHOT_PATH)
+    except (OSError, ValueError) as exc:
+        logger.warning("Cache snapshot %s not loaded: %s", SNAPSHOT_PATH, exc)
+        return None
+
+
+def save_on_shutdown() -> Optional[Dict[str, int]]:
+    if not SNAPSHOT_PATH or not SAVE_ON_SHUTDOWN:
+        return None
+    try:
+        return dump(SNAPSHOT_PATH)
+    except OSError as exc:
+        logger.warning("Cache snapshot %s not saved: %s", SNAPSHOT_PATH, exc)
+        return None
+
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.snapshot", description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("dump", help="write the current caches to a snapshot").add_argument("path")
+    commands.add_parser("load", help="restore a snapshot into the configured cache").add_argument("path")
+    history = commands.add_parser("import", help="seed the breakdown cache from a Goal history export")
+    history.add_argument("path", help="JSON array or NDJSON file, optionally .gz; '-' reads stdin")
+    history.add_argument("--language", choices=("en", "am"), help="language of every plan (default: detect)")
+    history.add_argument("--limit", type=int, help="newest goals to keep (default: breakdown cache size)")
+    history.add_argument("--output", help="also write a snapshot of the result, e.g. for CACHE_SNAPSHOT_PATH")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv: Optional[List[str]] = None) -> Dict[str, int]:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "dump":
+        if CACHE_BACKEND == "memory":
+            # A fresh process has nothing in memory; an empty snapshot would silently replace a good one
+            sys.exit(
+                "dump needs RESULT_CACHE_BACKEND=sqlite; with the in-memory cache, set "
+                "CACHE_SNAPSHOT_ON_SHUTDOWN so the server writes its own snapshot"
+            )
+        counts = dump(args.path)
+    elif args.command == "load":
+        counts = load(args.path)
+    else:
+        with _open_text(args.path, "r") as stream:
+            counts = import_history(stream, args.language, args.limit)
+        if args.output:
+            counts = {**counts, **{f"snapshot_{name}": value for name, value in dump(args.output).items()}}
+    if CACHE_BACKEND == "memory" and not getattr(args, "output", None):
+        logger.warning("RESULT_CACHE_BACKEND is memory; results vanish when this command exits")
+    print(json.dumps(counts))
+    return counts
+
+
+if __name__ == "__main__":
+    main_cli()
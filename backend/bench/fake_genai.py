@@ -0,0 +1,159 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Optional, Tuple
+
+
+class FakeGenAIClient:
+    """Local stand-in for google.genai.Client with tunable latency and failure injection."""
+
+    def __init__(
+        self,
+        latency_ms: float = 400.0,
+        latency_sigma: float = 0.5,
+        rate_limit_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        stream_chunk_chars: int = 24,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Counter = Counter()
+        self.models = _FakeModels(self)
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self))
+
+    def _draw(self) -> Tuple[float, float, float]:
+        with self._lock:
+            # Lognormal around the median keeps a realistic long tail
+            latency = self.latency_ms / 1000.0 * self._random.lognormvariate(0.0, self.latency_sigma) if self.latency_ms > 0 else 0.0
+            return latency, self._random.random(), self._random.random()
+
+    def _record(self, model: str, kind: str) -> None:
+        with self._lock:
+            self.calls[(model, kind)] += 1
+
+    def _respond(self, model: str, contents: str) -> Tuple[float, Any]:
+        kind = classify_prompt(contents)
+        self._record(model, kind)
+        latency, fault_roll, malformed_roll = self._draw()
+        if fault_roll < self.rate_limit_rate:
+            return latency, RuntimeError("429 RESOURCE_EXHAUSTED: fake quota exceeded")
+        if malformed_roll < self.malformed_rate:
+            text = '{"steps": ["truncated'
+        else:
+            text = json.dumps(_payload_for(kind, contents), ensure_ascii=False)
+        return latency, _response(text, contents)
+
+    def upstream_calls(self) -> Counter:
+        with self._lock:
+            totals: Counter = Counter()
+            for (_, kind), count in self.calls.items():
+                totals[kind] += count
+            return totals
+
+
+class _FakeModels:
+    def __init__(self, owner: FakeGenAIClient) -> None:
+        self._owner = owner
+
+    def generate_content(self, model: str, contents: str, config: Any = None) -> Any:
+        latency, outcome = self._owner._respond(model, contents)
+        time.sleep(latency)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class _FakeAsyncModels:
+    def __init__(self, owner: FakeGenAIClient) -> None:
+        self._owner = owner
+
+    async def generate_content(self, model: str, contents: str, config: Any = None) -> Any:
+        latency, outcome = self._owner._respond(model, contents)
+        await asyncio.sleep(latency)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def get(self, model: str) -> Any:
+        latency, _ = self._owner._draw()
+        await asyncio.sleep(latency)
+        return SimpleNamespace(name=f"models/{model}")
+
+    async def generate_content_stream(self, model: str, contents: str, config: Any = None) -> AsyncIterator[Any]:
+        latency, outcome = self._owner._respond(model, contents)
+        if isinstance(outcome, Exception):
+            await asyncio.sleep(latency)
+            raise outcome
+        text = outcome.text
+        size = max(1, self._owner.stream_chunk_chars)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+        async def chunks() -> AsyncIterator[Any]:
+            # Time to first token is a fraction of the full latency, the rest is spread across chunks
+            await asyncio.sleep(latency * 0.2)
+            for index, piece in enumerate(pieces):
+                await asyncio.sleep(latency * 0.8 / len(pieces))
+                last = index == len(pieces) - 1
+                yield SimpleNamespace(
+                    text=piece,
+                    candidates=None,
+                    usage_metadata=outcome.usage_metadata if last else None,
+                )
+
+        return chunks()
+
+
+def classify_prompt(contents: str) -> str:
+    if "intake filter" in contents:
+        return "guardrail"
+    if '"items"' in contents:
+        return "batch_sub_breakdown"
+    if '"status"' in contents and '"steps"' in contents:
+        return "combined"
+    if "sub-actions" in contents:
+        return "sub_breakdown"
+    return "breakdown"
+
+
+def _payload_for(kind: str, contents: str) -> Any:
+    if kind == "guardrail":
+        return {"status": "OK", "reason": "fake pass"}
+    if kind == "combined":
+        return {"status": "OK", "reason": "fake pass", **_payload_for("breakdown", contents)}
+    if kind == "batch_sub_breakdown":
+        count = int(contents.split("following ")[1].split(" ")[0])
+        return {"items": [{"substeps": [f"Sub-action {i}.{j}" for j in range(1, 4)]} for i in range(1, count + 1)]}
+    if kind == "sub_breakdown":
+        return {"substeps": ["Scope the work.", "Execute the protocol.", "Verify the outcome."]}
+    return {
+        "steps": [
+            "Define the objective and success metrics.",
+            "Audit available resources and constraints.",
+            "Build the minimum viable execution plan.",
+            "Execute in weekly sprints with checkpoints.",
+            "Review results and iterate on weak points.",
+        ],
+        "complexity": 5,
+    }
+
+
+def _response(text: str, prompt: str) -> Any:
+    prompt_tokens = max(1, len(prompt) // 4)
+    output_tokens = max(1, len(text) // 4)
+    usage = SimpleNamespace(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens,
+    )
+    candidate = SimpleNamespace(content=None, finish_reason="STOP")
+    return SimpleNamespace(text=text, candidates=[candidate], usage_metadata=usage)
@@ -0,0 +1,233 @@
+"""Load-test the API in-process against a local Gemini stand-in.
+
+    python -m bench.run --scenario breakdown --requests 500 --concurrency 50 --latency-ms 400
+
+Requests go through the real ASGI app (middleware, caches, single-flight, limiter,
+breakers) via httpx's ASGI transport; only the Gemini client is replaced.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from app import guardrails, main, ratelimit, services
+from app.circuit import circuit_stats, reset_breakers
+from bench.fake_genai import FakeGenAIClient
+
+SCENARIOS = ("breakdown", "sub-breakdown", "guardrail", "mixed")
+
+_GOAL_TEMPLATES = [
+    "Launch a {} side project",
+    "Learn {} in three months",
+    "Prepare for a {} certification",
+    "Grow a {} newsletter to 1,000 readers",
+    "Organize a {} community meetup",
+]
+_TOPICS = ["Python", "Rust", "marketing", "photography", "cloud", "design", "finance", "Amharic", "data", "music"]
+
+
+def build_corpus(size: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(size):
+        template = _GOAL_TEMPLATES[index % len(_GOAL_TEMPLATES)]
+        corpus.append(f"{template.format(rng.choice(_TOPICS))} #{index}")
+    return corpus
+
+
+def zipf_picker(corpus: List[str], skew: float, seed: int) -> Callable[[], str]:
+    # Real traffic repeats a few popular goals; skew 0 is uniform
+    rng = random.Random(seed)
+    weights = [1.0 / math.pow(rank + 1, skew) for rank in range(len(corpus))]
+    return lambda: rng.choices(corpus, weights=weights, k=1)[0]
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def reset_state() -> None:
+    reset_breakers()
+    ratelimit.reset_limiters()
+    guardrails._verdict_cache.clear()
+    services._breakdown_cache.clear()
+    services._sub_breakdown_cache.clear()
+
+
+async def _drive(
+    total: int, concurrency: int, issue: Callable[[int], Awaitable[bool]]
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    failures = 0
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal failures
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                ok = await issue(index)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+    return {"latencies": latencies, "failures": failures, "elapsed": elapsed}
+
+
+def _request_issuer(http: httpx.AsyncClient, scenario: str, pick: Callable[[], str], language: str):
+    async def breakdown(_: int) -> bool:
+        response = await http.post("/breakdown", json={"goal": pick(), "language": language})
+        return response.status_code == 200
+
+    async def sub_breakdown(_: int) -> bool:
+        response = await http.post("/sub-breakdown", json={"step": pick(), "language": language})
+        return response.status_code == 200
+
+    async def guardrail(_: int) -> bool:
+        verdict = await guardrails.classify_goal_async(pick(), services.get_client(), services._extract_response_text)
+        return verdict.get("status") in ("ok", "gibberish", "abuse")
+
+    async def mixed(index: int) -> bool:
+        return await (sub_breakdown if index % 3 == 2 else breakdown)(index)
+
+    return {"breakdown": breakdown, "sub-breakdown": sub_breakdown, "guardrail": guardrail, "mixed": mixed}[scenario]
+
+
+async def run_scenario(
+    scenario: str,
+    fake: FakeGenAIClient,
+    requests: int,
+    concurrency: int,
+    corpus_size: int = 200,
+    skew: float = 1.1,
+    language: str = "en",
+    seed: int = 7,
+    local_guardrail: Optional[bool] = None,
+) -> Dict[str, Any]:
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {scenario!r}; choose from {SCENARIOS}")
+    previous_client, previous_local = services.client, guardrails.LOCAL_GUARDRAIL
+    services.client = fake
+    if local_guardrail is not None:
+        guardrails.LOCAL_GUARDRAIL = local_guardrail
+    reset_state()
+    pick = zipf_picker(build_corpus(corpus_size, seed), skew, seed)
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as http:
+            outcome = await _drive(requests, concurrency, _request_issuer(http, scenario, pick, language))
+        # Let scheduled prefetch work settle so its upstream calls are counted
+        pending = list(services._prefetch_tasks)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        services.client = previous_client
+        guardrails.LOCAL_GUARDRAIL = previous_local
+
+    latencies = outcome["latencies"]
+    upstream = fake.upstream_calls()
+    return {
+        "scenario": scenario,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "failures": outcome["failures"],
+        "elapsed_s": round(outcome["elapsed"], 3),
+        "throughput_rps": round(len(latencies) / outcome["elapsed"], 1) if outcome["elapsed"] > 0 else None,
+        "latency_ms": {
+            name: round(value * 1000.0, 1) if value is not None else None
+            for name, value in (
+                ("p50", percentile(latencies, 0.5)),
+                ("p95", percentile(latencies, 0.95)),
+                ("p99", percentile(latencies, 0.99)),
+                ("max", max(latencies) if latencies else None),
+            )
+        },
+        "upstream_calls": dict(upstream),
+        "upstream_total": sum(upstream.values()),
+        "cache": services.cache_stats(),
+        "singleflight": services.singleflight_stats(),
+        "guardrail": guardrails.guardrail_stats(),
+        "circuits": circuit_stats(),
+        "rate_limits": ratelimit.limiter_stats(),
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    latency = report["latency_ms"]
+    calls = ", ".join(f"{kind}={count}" for kind, count in sorted(report["upstream_calls"].items())) or "none"
+    return "\n".join(
+        [
+            f"scenario      {report['scenario']} ({report['requests']} requests, concurrency {report['concurrency']})",
+            f"throughput    {report['throughput_rps']} req/s over {report['elapsed_s']}s, {report['failures']} failed",
+            f"latency ms    p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}",
+            f"upstream      {report['upstream_total']} calls ({calls})",
+        ]
+    )
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark Ignition against a local Gemini stand-in.")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--corpus", type=int, default=200, help="distinct goals in the request pool")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf skew of goal popularity; 0 is uniform")
+    parser.add_argument("--language", choices=("en", "am"), default="en")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="median upstream latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal spread of upstream latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls failing with 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of calls returning broken JSON")
+    parser.add_argument(
+        "--no-local-guardrail", action="store_true", help="send every guardrail check to the model tier"
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="show app logs such as injected-fault warnings")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("app").setLevel(logging.INFO if args.verbose else logging.CRITICAL)
+    fake = FakeGenAIClient(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    )
+    report = asyncio.run(
+        run_scenario(
+            args.scenario,
+            fake,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            corpus_size=args.corpus,
+            skew=args.skew,
+            language=args.language,
+            seed=args.seed,
+            local_guardrail=False if args.no_local_guardrail else None,
+        )
+    )
+    print(json.dumps(report, indent=2, ensure_ascii=False) if args.json else format_report(report))
+    return report
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,107 @@
+"""Measure cold start: interpreter + import, startup hook, background warm-up, and the first requests.
+
+    python -m bench.startup --runs 5
+    python -m bench.startup --runs 5 --warmup client,cache
+
+Every run is a fresh subprocess so import caches and lazy initialisation start cold.
+The Gemini client is the local stand-in, so only our own start-up work is measured.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+PHASES = ("process_ms", "import_ms", "startup_ms", "background_ms", "first_request_ms", "second_request_ms")
+
+
+async def _child_requests(app: Any) -> Dict[str, float]:
+    import httpx
+
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        timings["startup_ms"] = (time.perf_counter() - started) * 1000.0
+        # Traffic normally arrives after the background client warm-up; time it on its own
+        started = time.perf_counter()
+        background = getattr(app.state, "background_warm_up", None)
+        if background is not None:
+            await background
+        timings["background_ms"] = (time.perf_counter() - started) * 1000.0
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            # Distinct goals so both requests take the upstream path rather than the cache
+            for name, goal in (("first_request_ms", "Ship a cold start probe"), ("second_request_ms", "Run a warm probe")):
+                started = time.perf_counter()
+                response = await http.post("/breakdown", json={"goal": goal})
+                response.raise_for_status()
+                timings[name] = (time.perf_counter() - started) * 1000.0
+    return timings
+
+
+def _child() -> None:
+    started = time.perf_counter()
+    from app import main, services
+
+    timings = {"import_ms": (time.perf_counter() - started) * 1000.0}
+    if not (services.api_key and os.getenv("BENCH_USE_REAL_CLIENT") == "1"):
+        from bench.fake_genai import FakeGenAIClient
+
+        services.client = FakeGenAIClient(latency_ms=0)
+    timings.update(asyncio.run(_child_requests(main.app)))
+    print(json.dumps(timings))
+
+
+def run_once(warmup: str) -> Dict[str, float]:
+    env = {**os.environ, "STARTUP_WARMUP": warmup}
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child"],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process_ms"] = (time.perf_counter() - started) * 1000.0
+    return timings
+
+
+def summarize(runs: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        phase: {
+            "median": round(statistics.median(run[phase] for run in runs), 1),
+            "max": round(max(run[phase] for run in runs), 1),
+        }
+        for phase in PHASES
+    }
+
+
+def main_cli(argv: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    parser = argparse.ArgumentParser(description="Measure Ignition cold start.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", default="", help="STARTUP_WARMUP value for the measured processes")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child()
+        return {}
+
+    summary = summarize([run_once(args.warmup) for _ in range(max(1, args.runs))])
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"startup over {args.runs} runs (warm-up: {args.warmup or 'none'})")
+        for phase, values in summary.items():
+            print(f"{phase:<18} median={values['median']:>8.1f}  max={values['max']:>8.1f}")
+    return summary
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from app import services
+from bench.fake_genai import FakeGenAIClient
+from bench.run import run_scenario
+
+
+def test_fake_client_injects_rate_limits():
+    fake = FakeGenAIClient(latency_ms=0, rate_limit_rate=1.0, seed=1)
+    with pytest.raises(RuntimeError, match="429"):
+        fake.models.generate_content("gemini-2.5-flash", "Break down this goal")
+    assert fake.upstream_calls()["breakdown"] == 1
+
+
+def test_fake_client_streams_with_usage_metadata():
+    fake = FakeGenAIClient(latency_ms=0, stream_chunk_chars=5, seed=1)
+
+    async def collect():
+        stream = await fake.aio.models.generate_content_stream(model="m", contents="goal")
+        return [chunk async for chunk in stream]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 1
+    assert chunks[-1].usage_metadata.total_token_count > 0
+    assert '"complexity": 5' in "".join(chunk.text for chunk in chunks)
+
+
+def test_run_scenario_reports_latency_and_upstream_calls():
+    previous = services.client
+    fake = FakeGenAIClient(latency_ms=0, seed=3)
+    report = asyncio.run(run_scenario("mixed", fake, requests=30, concurrency=5, corpus_size=10))
+    assert services.client is previous
+    assert report["requests"] == 30
+    assert report["failures"] == 0
+    assert report["latency_ms"]["p50"] is not None
+    assert 0 < report["upstream_total"] <= 30
+    assert report["upstream_calls"]["breakdown"] <= 10
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from app import cache as cache_module
+from app.cache import MemoryCache, SQLiteCache, make_key
+
+
+def test_make_key_normalizes_whitespace_and_case():
+    chain = ["gemini-2.5-flash"]
+    assert make_key("Launch a startup", "en", chain) == make_key("  launch  a STARTUP ", "en", chain)
+    assert make_key("Launch a startup", "en", chain) != make_key("Launch a startup", "am", chain)
+    assert make_key("Launch a startup", "en", chain) != make_key("Launch a startup", "en", ["gemini-2.0-flash"])
+
+
+def test_memory_cache_evicts_and_expires():
+    cache = MemoryCache("breakdown", maxsize=2, ttl=0.05)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    cache.set("c", {"v": 3})
+    assert cache.get("a") is None
+    assert cache.get("c") == {"v": 3}
+    time.sleep(0.06)
+    assert cache.get("c") is None
+    stats = cache.stats.as_dict()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = SQLiteCache("breakdown", maxsize=2, ttl=0, path=path)
+    reader = SQLiteCache("breakdown", maxsize=2, ttl=0, path=path)
+    writer.set("goal", {"steps": ["ግብ"], "complexity": 3})
+    assert reader.get("goal") == {"steps": ["ግብ"], "complexity": 3}
+    writer.set("other", {"v": 1})
+    writer.set("third", {"v": 2})
+    assert len(reader) == 2
+    assert writer.stats.as_dict()["evictions"] == 1
+
+
+def test_cached_result_is_read_only_and_encoded_once():
+    cache = MemoryCache("breakdown", maxsize=2, ttl=0)
+    cache.set("goal", {"steps": ["a", "b"], "complexity": 2})
+    hit = cache.get("goal")
+    assert cache.get("goal") is hit
+    assert hit.body == b'{"steps":["a","b"],"complexity":2}'
+    with pytest.raises(TypeError):
+        hit.data["complexity"] = 9
+    copy = hit.to_dict()
+    copy["steps"].append("c")
+    assert hit.data["steps"] == ("a", "b")
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_items_lists_live_entries_oldest_first_with_their_expiry(backend, tmp_path):
+    if backend == "memory":
+        cache = MemoryCache("breakdown", maxsize=4, ttl=60)
+    else:
+        cache = SQLiteCache("breakdown", maxsize=4, ttl=60, path=str(tmp_path / "cache.sqlite3"))
+    cache.set("old", {"v": 1})
+    cache.set("gone", {"v": 2}, ttl=0.01)
+    cache.set("new", {"v": 3}, ttl=5)
+    time.sleep(0.02)
+    items = list(cache.items())
+    assert [key for key, _, _ in items] == ["old", "new"]
+    assert items[1][1] == {"v": 3}
+    assert time.time() < items[1][2] <= time.time() + 5
+
+
+def test_sqlite_hits_do_not_write_until_the_touch_interval(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "SQLITE_TOUCH_SECONDS", 60)
+    cache = SQLiteCache("breakdown", maxsize=2, ttl=0, path=str(tmp_path / "cache.sqlite3"))
+    cache.set("goal", {"v": 1})
+    conn = cache._connect()
+    changes = conn.total_changes
+    assert cache.get("goal") == {"v": 1}
+    assert cache.get("goal") == {"v": 1}
+    assert conn.total_changes == changes
+
+    monkeypatch.setattr(cache_module, "SQLITE_TOUCH_SECONDS", 0)
+    cache.get("goal")
+    assert conn.total_changes == changes + 1
@@ -0,0 +1,49 @@
+import time
+
+from app import circuit
+from app.circuit import CircuitBreaker, get_breaker, reset_breakers, route_models
+
+
+def test_breaker_opens_then_half_opens_and_recovers():
+    breaker = CircuitBreaker("m", min_requests=3, error_threshold=0.5, cooldown_seconds=0.05)
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    assert breaker.state == circuit.CLOSED
+    breaker.record_failure(0.1)
+    assert breaker.state == circuit.OPEN
+    assert not breaker.available()
+
+    time.sleep(0.06)
+    assert breaker.available()
+    assert breaker.try_begin()
+    assert breaker.state == circuit.HALF_OPEN
+    assert not breaker.available()  # only one probe at a time
+    assert not breaker.try_begin()
+    breaker.record_success(0.1)
+    assert breaker.state == circuit.CLOSED
+
+
+def test_failed_probe_reopens_circuit():
+    breaker = CircuitBreaker("m", min_requests=1, error_threshold=0.5, cooldown_seconds=0.01)
+    breaker.record_failure(0.1)
+    time.sleep(0.02)
+    assert breaker.try_begin()
+    breaker.record_failure(0.1)
+    assert breaker.state == circuit.OPEN
+
+
+def test_route_skips_open_and_demotes_slow_models():
+    reset_breakers()
+    try:
+        chain = ["primary", "secondary", "tertiary"]
+        get_breaker("primary")._open(time.monotonic())
+        slow = get_breaker("secondary")
+        slow.slow_threshold_seconds = 0.5
+        slow.record_success(2.0)
+        assert route_models(chain) == ["tertiary", "secondary"]
+
+        get_breaker("secondary")._open(time.monotonic())
+        get_breaker("tertiary")._open(time.monotonic())
+        assert route_models(chain) == chain
+    finally:
+        reset_breakers()
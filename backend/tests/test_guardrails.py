@@ -0,0 +1,65 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app import guardrails
+from app.guardrails import _local_guardrail, classify_goal, classify_goal_async
+
+
+@pytest.mark.parametrize(
+    "goal, status",
+    [
+        ("asdfghjkl qwrtzp", "gibberish"),
+        ("aaaaaaaaaaaaaa", "gibberish"),
+        ("😀😀😀😀😀", "gibberish"),
+        ("you are an idiot", "abuse"),
+        ("አንተ ደደብ", "abuse"),
+        ("fuck you", "abuse"),
+        ("you're such a stupid bot", "abuse"),
+        ("ደደብ ነህ", "abuse"),
+    ],
+)
+def test_local_tier_decides_obvious_inputs(goal, status):
+    assert _local_guardrail(goal)["status"] == status
+
+
+@pytest.mark.parametrize(
+    "goal",
+    [
+        "Launch MVP",
+        "Launch a startup in Addis Ababa",
+        "የንግድ ሥራ ጀምር በአዲስ አበባ",
+        "I hate my job, help me quit",
+        "qwertyuiop",
+        # Fluent text can still be harmful; only the model judges intent
+        "Help me harass my ex until she breaks",
+        "Plan how to stalk my coworker after work",
+        "Grow my shitake mushroom farm",
+        # Insult words inside a goal are not aimed at anyone
+        "Stop making stupid mistakes with my budget",
+        "Read The Idiot by Dostoevsky",
+        "Build a bullshit detector for news",
+        "fucking useless plan",
+    ],
+)
+def test_local_tier_escalates_ambiguous_inputs(goal):
+    assert _local_guardrail(goal) is None
+
+
+def test_model_verdicts_are_cached_by_normalized_goal():
+    guardrails._verdict_cache.clear()
+    calls = []
+
+    async def generate_content(model, contents, config=None):
+        calls.append(contents)
+        return SimpleNamespace(text=json.dumps({"status": "OK", "reason": "fine"}))
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    extract = lambda response: response.text
+    first = asyncio.run(classify_goal_async("Launch MVP", client, extract))
+    second = classify_goal("  launch mvp! ", None, extract)
+    assert first == second == {"status": "ok", "reason": "fine"}
+    assert len(calls) == 1
+    guardrails._verdict_cache.clear()
@@ -1,5 +1,9 @@
+import json
+
 from fastapi.testclient import TestClient
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
+from app import deadline
+from app.cache import CachedResult
 from app.main import app
 
 client = TestClient(app)
@@ -7,30 +11,120 @@ client = TestClient(app)
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
-    assert response.json() == {"status": "System Online", "latency": "12ms"}
+    data = response.json()
+    assert data["status"] == "System Online"
+    assert data["latency"] == "n/a" or data["latency"].endswith("ms")
+
+@patch("app.main.generate_sub_breakdown_result_async", new_callable=AsyncMock)
+def test_metrics_endpoint_reports_measured_latency(mock_generate_sub):
+    mock_generate_sub.return_value = CachedResult.of({"substeps": ["Sub 1"]})
+    client.post("/sub-breakdown", json={"step": "Test Step"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'ignition_http_request_duration_seconds_count{endpoint="/sub-breakdown",method="POST",status="200"}' in body
+    assert 'ignition_cache_hit_ratio{cache="breakdown"}' in body
+    assert 'ignition_prefetch_pending ' in body
+    assert 'outcome="pending"' not in body
+    assert client.get("/").json()["latency"].endswith("ms")
 
-@patch("app.main.generate_breakdown")
+@patch("app.main.generate_breakdown_result_async", new_callable=AsyncMock)
 def test_breakdown_goal(mock_generate):
-    mock_generate.return_value = {
+    mock_generate.return_value = CachedResult.of({
         "steps": ["Step 1", "Step 2"],
         "complexity": 5
-    }
+    })
     
     response = client.post("/breakdown", json={"goal": "Test Goal", "language": "am"})
     assert response.status_code == 200
     data = response.json()
     assert data["steps"] == ["Step 1", "Step 2"]
     assert data["complexity"] == 5
-    mock_generate.assert_called_once_with("Test Goal", "am")
+    mock_generate.assert_awaited_once_with("Test Goal", "am")
+
+@patch("app.main.generate_breakdown_result_async", new_callable=AsyncMock)
+def test_breakdown_serves_etag_and_not_modified(mock_generate):
+    mock_generate.return_value = CachedResult.of({"steps": ["ግብ"], "complexity": 3})
 
-@patch("app.main.generate_sub_breakdown")
+    first = client.post("/breakdown", json={"goal": "Test Goal"})
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    assert first.content == '{"steps":["ግብ"],"complexity":3}'.encode("utf-8")
+
+    revalidated = client.post("/breakdown", json={"goal": "Test Goal"}, headers={"If-None-Match": f"W/{etag}"})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+    stale = client.post("/breakdown", json={"goal": "Test Goal"}, headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200
+
+@patch("app.main.generate_sub_breakdown_result_async", new_callable=AsyncMock)
 def test_sub_breakdown_step(mock_generate_sub):
-    mock_generate_sub.return_value = {
+    mock_generate_sub.return_value = CachedResult.of({
         "substeps": ["Sub 1", "Sub 2"]
-    }
+    })
     
     response = client.post("/sub-breakdown", json={"step": "Test Step", "language": "am"})
     assert response.status_code == 200
     data = response.json()
     assert data["substeps"] == ["Sub 1", "Sub 2"]
-    mock_generate_sub.assert_called_once_with("Test Step", "am")
+    mock_generate_sub.assert_awaited_once_with("Test Step", "am")
+
+@patch("app.main.stream_breakdown_async")
+def test_breakdown_stream_emits_server_sent_events(mock_stream):
+    async def events(goal, language):
+        yield {"event": "step", "data": {"index": 0, "step": "Step 1"}}
+        yield {"event": "done", "data": {"steps": ["Step 1"], "complexity": 2}}
+
+    mock_stream.side_effect = events
+    response = client.post("/breakdown/stream", json={"goal": "Test Goal"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert 'event: step\ndata: {"index": 0, "step": "Step 1"}' in response.text
+    assert "event: done" in response.text
+
+@patch("app.main.generate_sub_breakdown_batch_async", new_callable=AsyncMock)
+def test_sub_breakdown_batch(mock_batch):
+    mock_batch.return_value = [{"step": "A", "substeps": ["Sub 1"]}]
+
+    response = client.post("/sub-breakdown/batch", json={"steps": ["A"], "language": "am"})
+    assert response.status_code == 200
+    assert response.json() == {"results": [{"step": "A", "substeps": ["Sub 1"]}]}
+    mock_batch.assert_awaited_once_with(["A"], "am")
+
+    assert client.post("/sub-breakdown/batch", json={"steps": []}).status_code == 422
+
+@patch("app.main.stream_breakdown_tree_async")
+def test_breakdown_tree_streams_ndjson(mock_tree):
+    async def events(goal, language, depth, budget):
+        yield {"event": "plan", "data": {"steps": ["Step 1"], "complexity": 2}}
+        yield {"event": "node", "data": {"id": "1", "parent": None, "depth": 1, "step": "Step 1", "substeps": ["Sub 1"]}}
+        yield {"event": "done", "data": {"nodes": 1, "calls": 1, "truncated": 0, "budget": budget, "depth": depth}}
+
+    mock_tree.side_effect = events
+    response = client.post("/breakdown/tree", json={"goal": "Test Goal", "depth": 2, "budget": 4})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["event"] for line in lines] == ["plan", "node", "done"]
+    assert lines[-1]["data"]["budget"] == 4
+
+    assert client.post("/breakdown/tree", json={"goal": "Test Goal", "depth": 9}).status_code == 422
+
+@patch("app.main.generate_breakdown_result_async", new_callable=AsyncMock)
+def test_breakdown_applies_client_deadline_header(mock_generate):
+    seen = []
+
+    async def record(goal, language):
+        seen.append(deadline.remaining())
+        return CachedResult.of({"steps": ["Step 1"], "complexity": 1})
+
+    mock_generate.side_effect = record
+    client.post("/breakdown", json={"goal": "Test Goal"}, headers={"X-Request-Deadline-Ms": "1500"})
+    client.post("/breakdown", json={"goal": "Test Goal"}, headers={"X-Request-Deadline-Ms": "9999999"})
+    assert 0 < seen[0] <= 1.5
+    assert seen[1] <= deadline.MAX_DEADLINE_SECONDS
+    assert deadline.remaining() is None
@@ -0,0 +1,51 @@
+from app.normalize import MinHashIndex, canonicalize
+
+
+def test_canonicalize_collapses_case_whitespace_and_punctuation():
+    assert canonicalize("Launch a startup") == "launch a startup"
+    assert canonicalize("  launch a startup ") == "launch a startup"
+    assert canonicalize("Launch a startup!") == "launch a startup"
+    assert canonicalize("“Launch a startup,” today.") == "launch a startup today"
+    assert canonicalize("ＬＡＵＮＣＨ a startup") == "launch a startup"
+    assert canonicalize("Don’t launch – yet") == canonicalize("don't launch yet")
+
+
+def test_canonicalize_keeps_meaningful_symbols():
+    for left, right in [
+        ("Learn C#", "Learn C"),
+        ("Re-sign the lease", "Resign the lease"),
+        ("Cut costs 50%", "Cut costs 50"),
+        ("R&D roadmap", "R D roadmap"),
+        ("Run 3.5 km", "Run 35 km"),
+    ]:
+        assert canonicalize(left) != canonicalize(right)
+    assert canonicalize("Cut costs 50%.") == "cut costs 50%"
+
+
+def test_canonicalize_is_geez_aware():
+    # Ethiopic wordspace and full stop, plus interchangeable ሐ/ሀ and ሠ/ሰ families
+    assert canonicalize("የንግድ፡ሥራ ጀምር።") == canonicalize("የንግድ ስራ ጀምር")
+    assert canonicalize("ሐሳብ") == canonicalize("ሀሳብ")
+    assert canonicalize("ፀሐይ") == "ጸሀይ"
+
+
+def test_canonicalize_keeps_pure_punctuation_distinct():
+    assert canonicalize("!!!") == "!!!"
+    assert canonicalize("???") != canonicalize("!!!")
+
+
+def test_minhash_index_finds_near_duplicates_within_namespace():
+    index = MinHashIndex(threshold=0.7, maxsize=10)
+    index.add("en", "launch a saas startup in ethiopia", "key-1")
+    index.add("en", "learn to cook italian food", "key-2")
+    assert index.query("en", "launch a saas startup in ethiopia now") == "key-1"
+    assert index.query("am", "launch a saas startup in ethiopia now") is None
+    assert index.query("en", "run a marathon") is None
+
+
+def test_minhash_index_is_bounded():
+    index = MinHashIndex(threshold=0.9, maxsize=2)
+    for number in range(3):
+        index.add("en", f"goal number {number}", f"key-{number}")
+    assert len(index) == 2
+    assert index.query("en", "goal number 0") is None
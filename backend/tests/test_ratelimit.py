@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from app.ratelimit import (
+    PRIORITY_INTERACTIVE,
+    PRIORITY_PREFETCH,
+    ModelLimiter,
+    RateLimitExceeded,
+    estimate_tokens,
+)
+
+
+def test_unlimited_limiter_admits_immediately():
+    limiter = ModelLimiter("m", rpm=0, tpm=0)
+    asyncio.run(limiter.acquire(10_000, PRIORITY_INTERACTIVE, max_wait=0))
+    assert limiter.snapshot()["rejected"] == 0
+
+
+def test_rejects_fast_when_wait_exceeds_deadline():
+    limiter = ModelLimiter("m", rpm=1, tpm=0)
+    asyncio.run(limiter.acquire(1, PRIORITY_INTERACTIVE, max_wait=0))
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.acquire(1, PRIORITY_INTERACTIVE, max_wait=0.5))
+    assert limiter.snapshot() == {"admitted": 1, "rejected": 1, "queued": 0, "queue_depth": 0}
+
+
+def test_token_budget_limits_admission():
+    limiter = ModelLimiter("m", rpm=0, tpm=600)
+    limiter.acquire_sync(600, PRIORITY_INTERACTIVE, max_wait=0)
+    # 10 tokens/sec refill: 5 tokens need ~0.5s
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire_sync(5, PRIORITY_INTERACTIVE, max_wait=0.1)
+    limiter.acquire_sync(5, PRIORITY_INTERACTIVE, max_wait=1.0)
+
+
+def test_interactive_requests_jump_ahead_of_prefetch():
+    limiter = ModelLimiter("m", rpm=600, tpm=0)
+    limiter.requests.tokens = 0
+    order = []
+
+    async def request(name, priority, delay):
+        await asyncio.sleep(delay)
+        await limiter.acquire(1, priority, max_wait=2)
+        order.append(name)
+
+    async def run():
+        await asyncio.gather(
+            request("prefetch", PRIORITY_PREFETCH, 0),
+            request("interactive", PRIORITY_INTERACTIVE, 0.01),
+        )
+
+    asyncio.run(run())
+    assert order == ["interactive", "prefetch"]
+
+
+def test_estimate_tokens_counts_prompt_and_output_budget():
+    assert estimate_tokens("x" * 400, 512) == 612
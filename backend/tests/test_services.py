@@ -0,0 +1,589 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import services
+from app import budget, deadline, guardrails, metrics, ratelimit
+from app.budget import CallKind
+from app.circuit import ProbeInFlight, get_breaker, reset_breakers
+
+
+class FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def generate_content(self, model, contents, config=None):
+        return self.owner.respond(model, contents)
+
+
+class FakeAsyncModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(0)
+        return self.owner.respond(model, contents)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        text = self.owner.respond(model, contents).text
+
+        async def chunks():
+            for start in range(0, len(text), 7):
+                await asyncio.sleep(0)
+                yield SimpleNamespace(text=text[start:start + 7])
+
+        return chunks()
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+        self.models = FakeModels(self)
+        self.aio = SimpleNamespace(models=FakeAsyncModels(self))
+
+    def respond(self, model, contents):
+        self.calls.append((model, contents))
+        if "intake filter" in contents:
+            payload = {"status": "OK", "reason": "clear objective"}
+        elif '"items"' in contents:
+            count = int(contents.split("following ")[1].split(" ")[0])
+            payload = {"items": [{"substeps": [f"Batch {i}.{j}" for j in range(1, 4)]} for i in range(count)]}
+        elif '"status"' in contents and '"steps"' in contents:
+            if "flag me" in contents:
+                payload = {"status": "ABUSE", "reason": "hostile", "steps": [], "complexity": 0}
+            else:
+                payload = {"status": "OK", "reason": "clear", "steps": [f"Step {i}" for i in range(1, 6)], "complexity": 4}
+        elif "sub-actions" in contents:
+            payload = {"substeps": ["Sub A", "Sub B", "Sub C"]}
+        else:
+            payload = {"steps": [f"Step {i}" for i in range(1, 6)], "complexity": 4}
+        return SimpleNamespace(text=json.dumps(payload))
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(services, "client", fake)
+    reset_breakers()
+    ratelimit.reset_limiters()
+    budget.reset_budgets()
+    guardrails._verdict_cache.clear()
+    services._breakdown_cache.clear()
+    services._sub_breakdown_cache.clear()
+    yield fake
+    reset_breakers()
+    ratelimit.reset_limiters()
+    services._breakdown_cache.clear()
+    services._sub_breakdown_cache.clear()
+
+
+def test_async_breakdown_uses_async_client_and_cache(fake_client):
+    first = asyncio.run(services.generate_breakdown_async("Launch MVP", "en"))
+    second = asyncio.run(services.generate_breakdown_async("Launch MVP", "en"))
+    assert first == second
+    assert first["complexity"] == 4
+    # guardrail + breakdown on the first call; cached verdict and cached plan serve the second
+    assert len(fake_client.calls) == 2
+
+
+def test_sync_and_async_share_sub_breakdown_cache(fake_client):
+    sync_result = services.generate_sub_breakdown("Audit stack", "am")
+    async_result = asyncio.run(services.generate_sub_breakdown_async("Audit stack", "am"))
+    assert sync_result == async_result == {"substeps": ["Sub A", "Sub B", "Sub C"]}
+    assert len(fake_client.calls) == 1
+
+
+def test_async_rate_limit_retry_does_not_block(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "BASE_RETRY_DELAY", 0.0)
+    original = fake_client.respond
+    failures = iter([True])
+
+    def flaky(model, contents):
+        if next(failures, False):
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+        return original(model, contents)
+
+    monkeypatch.setattr(fake_client, "respond", flaky)
+    result = asyncio.run(services.generate_sub_breakdown_async("Map pricing", "en"))
+    assert result["substeps"] == ["Sub A", "Sub B", "Sub C"]
+
+
+def test_offline_fallback_is_never_cached(fake_client, monkeypatch):
+    original = fake_client.respond
+
+    def malformed(model, contents):
+        if "intake filter" in contents:
+            return original(model, contents)
+        fake_client.calls.append((model, contents))
+        return SimpleNamespace(text="not json")
+
+    monkeypatch.setattr(fake_client, "respond", malformed)
+    skipped_before = services.cache_stats()["breakdown"]["skipped"]
+    result = asyncio.run(services.generate_breakdown_async("Research markets", "en"))
+    assert result["complexity"] == 0
+    assert len(services._breakdown_cache) == 0
+    assert services.cache_stats()["breakdown"]["skipped"] == skipped_before + 1
+
+
+def test_concurrent_identical_requests_share_one_upstream_call(fake_client):
+    before = services.singleflight_stats()["sub_breakdown"]["coalesced"]
+
+    async def burst():
+        return await asyncio.gather(
+            *(services.generate_sub_breakdown_async("Survey 100 users", "en") for _ in range(10))
+        )
+
+    results = asyncio.run(burst())
+    assert all(result == results[0] for result in results)
+    assert len(fake_client.calls) == 1
+    assert services.singleflight_stats()["sub_breakdown"]["coalesced"] == before + 9
+
+
+def test_speculative_guardrail_discards_flagged_plan(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "SPECULATIVE_GUARDRAIL", True)
+    original = fake_client.respond
+
+    def abusive(model, contents):
+        if "intake filter" in contents:
+            fake_client.calls.append((model, contents))
+            return SimpleNamespace(text=json.dumps({"status": "ABUSE", "reason": "insult"}))
+        return original(model, contents)
+
+    monkeypatch.setattr(fake_client, "respond", abusive)
+    flagged = asyncio.run(services.generate_breakdown_async("You are useless", "en"))
+    assert flagged["steps"][0].startswith("Channel secured")
+    assert len(services._breakdown_cache) == 0
+
+    monkeypatch.setattr(fake_client, "respond", original)
+    accepted = asyncio.run(services.generate_breakdown_async("Launch MVP", "en"))
+    assert accepted["complexity"] == 4
+    assert len(services._breakdown_cache) == 1
+
+
+def test_incremental_parser_emits_steps_as_they_complete():
+    parser = services._IncrementalPlanParser()
+    assert parser.feed('{"steps": ["Audit \\"core\\" market", "Sur') == ['Audit "core" market']
+    assert parser.feed('vey users"') == ["Survey users"]
+    assert parser.feed(', "Map", "Build", "Ship"], "complexity": 7}') == ["Map", "Build", "Ship"]
+    assert len(parser.steps) == 5
+
+
+def test_stream_breakdown_yields_steps_then_caches_final_plan(fake_client):
+    async def collect():
+        return [event async for event in services.stream_breakdown_async("Launch MVP", "en")]
+
+    events = asyncio.run(collect())
+    assert [event["event"] for event in events] == ["step"] * 5 + ["complexity", "done"]
+    assert events[0]["data"] == {"index": 0, "step": "Step 1"}
+    assert events[-1]["data"] == {"steps": [f"Step {i}" for i in range(1, 6)], "complexity": 4}
+    assert len(services._breakdown_cache) == 1
+
+
+def test_batch_sub_breakdown_expands_misses_in_one_call(fake_client):
+    cached = services.generate_sub_breakdown("Audit stack", "en")
+    results = asyncio.run(
+        services.generate_sub_breakdown_batch_async(
+            ["Audit stack", "Survey users", "Map pricing", "Survey users"], "en"
+        )
+    )
+    assert [item["step"] for item in results] == ["Audit stack", "Survey users", "Map pricing", "Survey users"]
+    assert results[0]["substeps"] == cached["substeps"]
+    assert results[1]["substeps"] == results[3]["substeps"] == ["Batch 0.1", "Batch 0.2", "Batch 0.3"]
+    assert results[2]["substeps"] == ["Batch 1.1", "Batch 1.2", "Batch 1.3"]
+    # one single-step call plus one combined call for the two distinct misses
+    assert len(fake_client.calls) == 2
+    assert len(services._sub_breakdown_cache) == 3
+
+
+def test_batch_misses_are_shared_with_concurrent_callers(fake_client, monkeypatch):
+    original = fake_client.aio.models.generate_content
+
+    async def slow(model, contents, config=None):
+        await asyncio.sleep(0.05)
+        return await original(model, contents, config)
+
+    monkeypatch.setattr(fake_client.aio.models, "generate_content", slow)
+
+    async def run():
+        first = asyncio.ensure_future(services.generate_sub_breakdown_batch_async(["A", "B", "C"], "en"))
+        await asyncio.sleep(0)
+        return await asyncio.gather(
+            first,
+            services.generate_sub_breakdown_async("B", "en"),
+            services.generate_sub_breakdown_batch_async(["B", "C"], "en"),
+        )
+
+    batch, drill, overlap = asyncio.run(run())
+    assert drill == {"substeps": ["Batch 1.1", "Batch 1.2", "Batch 1.3"]}
+    assert overlap == batch[1:]
+    # One upstream call served all three callers
+    assert len(fake_client.calls) == 1
+
+
+def test_batch_parser_falls_back_per_item():
+    payload = json.dumps({"items": [{"substeps": ["A", "B", "C"]}, {"substeps": []}]})
+    parsed = services._safe_parse_batch_sub_response(payload, 3, "en")["items"]
+    assert parsed[0] == {"substeps": ["A", "B", "C"]}
+    assert parsed[1] == parsed[2] == services._offline_substeps("en")
+
+
+def test_prefetch_warms_sub_breakdown_cache(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "PREFETCH_SUBSTEPS", True)
+
+    async def run():
+        plan = await services.generate_breakdown_async("Launch MVP", "en")
+        await asyncio.gather(*services._prefetch_tasks)
+        return plan
+
+    plan = asyncio.run(run())
+    calls_after_prefetch = len(fake_client.calls)
+    # guardrail, plan and one combined prefetch call for all five steps
+    assert calls_after_prefetch == 3
+    drill = services.generate_sub_breakdown(plan["steps"][2], "en")
+    assert drill["substeps"] == ["Batch 2.1", "Batch 2.2", "Batch 2.3"]
+    assert len(fake_client.calls) == calls_after_prefetch
+
+
+def test_prefetch_outlives_the_request_deadline(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "PREFETCH_SUBSTEPS", True)
+    original = fake_client.aio.models.generate_content
+
+    async def slow_batches(model, contents, config=None):
+        if '"items"' in contents:
+            await asyncio.sleep(0.4)
+        return await original(model, contents, config)
+
+    monkeypatch.setattr(fake_client.aio.models, "generate_content", slow_batches)
+    before = metrics.DEADLINE_FALLBACKS.value(kind="sub_breakdown")
+    misses = services.cache_stats()["sub_breakdown"]["misses"]
+
+    async def run():
+        with deadline.use_deadline(0.3):
+            plan = await services.generate_breakdown_async("Launch MVP", "en")
+        await asyncio.gather(*services._prefetch_tasks)
+        return plan
+
+    plan = asyncio.run(run())
+    assert len(services._sub_breakdown_cache) == 5
+    # The scheduling check is stats-neutral; only the batch's own lookups count
+    assert services.cache_stats()["sub_breakdown"]["misses"] - misses == 5
+    assert services.generate_sub_breakdown(plan["steps"][0], "en")["substeps"] == ["Batch 0.1", "Batch 0.2", "Batch 0.3"]
+    assert metrics.DEADLINE_FALLBACKS.value(kind="sub_breakdown") == before
+
+
+def test_shared_call_is_not_bound_by_the_leaders_deadline(fake_client, monkeypatch):
+    original = fake_client.aio.models.generate_content
+
+    async def slow(model, contents, config=None):
+        await asyncio.sleep(0.5)
+        return await original(model, contents, config)
+
+    monkeypatch.setattr(fake_client.aio.models, "generate_content", slow)
+
+    async def with_deadline(seconds):
+        with deadline.use_deadline(seconds):
+            return await services.generate_sub_breakdown_async("Ship v1", "en")
+
+    async def run():
+        hasty = asyncio.ensure_future(with_deadline(0.3))
+        await asyncio.sleep(0)
+        return await asyncio.gather(hasty, with_deadline(5))
+
+    hasty, patient = asyncio.run(run())
+    assert hasty == services._offline_substeps("en")
+    assert patient == {"substeps": ["Sub A", "Sub B", "Sub C"]}
+    assert len(fake_client.calls) == 1
+
+
+def test_timed_out_call_counts_against_the_model(fake_client, monkeypatch):
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "hung-model")
+
+    async def hung(model, contents, config=None):
+        await asyncio.sleep(3)
+
+    monkeypatch.setattr(fake_client.aio.models, "generate_content", hung)
+
+    async def run():
+        with deadline.use_deadline(0.4):
+            return await services._call_model_async("hung-model", "prompt", json.loads, CallKind("sub_breakdown", "en"))
+
+    with pytest.raises(services.DeadlineExceeded):
+        asyncio.run(run())
+    snapshot = get_breaker("hung-model").snapshot()
+    assert snapshot["error_rate"] == 1.0
+    assert snapshot["mean_latency_ms"] >= 300
+
+
+def test_hedged_request_returns_first_model_to_answer(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "HEDGE_AFTER_SECONDS", 0.01)
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "slow-model,fast-model")
+    original = fake_client.aio.models.generate_content
+
+    async def slow_primary(model, contents, config=None):
+        if model == "slow-model":
+            await asyncio.sleep(5)
+        return await original(model, contents, config)
+
+    monkeypatch.setattr(fake_client.aio.models, "generate_content", slow_primary)
+    result = asyncio.run(asyncio.wait_for(services.generate_sub_breakdown_async("Ship v1", "en"), timeout=2))
+    assert result["substeps"] == ["Sub A", "Sub B", "Sub C"]
+    assert fake_client.calls == [("fast-model", fake_client.calls[0][1])]
+
+
+def test_half_open_model_admits_a_single_probe(fake_client):
+    breaker = get_breaker("probe-model")
+    breaker.cooldown_seconds = 0
+    breaker._open(time.monotonic())
+    assert breaker.try_begin()
+
+    kind = CallKind("sub_breakdown", "en")
+    with pytest.raises(ProbeInFlight):
+        asyncio.run(services._call_model_async("probe-model", "prompt", json.loads, kind))
+    with pytest.raises(ProbeInFlight):
+        services._call_model("probe-model", "prompt", json.loads, kind)
+    assert fake_client.calls == []
+
+
+def test_local_quota_exhaustion_falls_back_without_calling_gemini(fake_client, monkeypatch):
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "only-model")
+    exhausted = ratelimit.ModelLimiter("only-model", rpm=1, tpm=0)
+    exhausted.requests.tokens = 0
+    ratelimit._limiters["only-model"] = exhausted
+
+    result = asyncio.run(services.generate_sub_breakdown_async("Deploy", "en"))
+    assert result == services._offline_substeps("en")
+    assert fake_client.calls == []
+    assert len(services._sub_breakdown_cache) == 0
+    assert exhausted.snapshot()["rejected"] == 1
+
+
+def test_equivalent_and_near_duplicate_goals_hit_the_cache(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "_goal_index", services.MinHashIndex(0.8, maxsize=16))
+    asyncio.run(services.generate_breakdown_async("Launch a startup in Addis Ababa", "en"))
+    plan_calls = lambda: [c for c in fake_client.calls if "intake filter" not in c[1]]
+    assert len(plan_calls()) == 1
+
+    asyncio.run(services.generate_breakdown_async("LAUNCH  a startup in Addis Ababa!", "en"))
+    asyncio.run(services.generate_breakdown_async("Launch a startup in Addis Ababa now", "en"))
+    assert len(plan_calls()) == 1
+    assert services.cache_stats()["breakdown"]["near_duplicate_hits"] == 1
+
+
+def test_client_is_built_on_first_use(monkeypatch):
+    monkeypatch.setattr(services, "client", services._UNSET)
+    monkeypatch.setattr(services, "api_key", None)
+    assert services.get_client() is None
+    assert services.client is None
+
+
+def test_background_warm_up_builds_the_client_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(services, "client", services._UNSET)
+    monkeypatch.setattr(services, "api_key", None)
+    monkeypatch.setattr(services, "WARMUP_TARGETS", set())
+    built_on = []
+    original = services._build_client
+    monkeypatch.setattr(services, "_build_client", lambda: built_on.append(threading.current_thread()) or original())
+
+    async def run():
+        await services.start_background_warm_up()
+
+    asyncio.run(run())
+    assert services.client is None
+    assert built_on and built_on[0] is not threading.main_thread()
+
+    monkeypatch.setattr(services, "WARMUP_TARGETS", {"client"})
+    # A blocking STARTUP_WARMUP already prepared the client
+    assert services.start_background_warm_up() is None
+
+
+def test_warm_up_prepares_client_and_caches(fake_client):
+    timings = asyncio.run(services.warm_up({"client", "cache"}))
+    assert set(timings) == {"client", "cache"}
+    assert services.get_client() is fake_client
+    assert fake_client.calls == []
+
+
+def test_tree_streams_nodes_and_respects_call_budget(fake_client):
+    async def collect(**kwargs):
+        return [event async for event in services.stream_breakdown_tree_async("Launch MVP", "en", **kwargs)]
+
+    events = asyncio.run(collect(depth=3, budget=5))
+    assert events[0]["event"] == "plan"
+    nodes = [event["data"] for event in events if event["event"] == "node"]
+    done = events[-1]["data"]
+    # Guardrail and plan calls count too: every upstream attempt spends budget
+    assert done["calls"] == len(fake_client.calls) == 5
+    # One batch for the five steps, then two of the five substep groups fit the budget
+    assert len([n for n in nodes if n["depth"] == 1]) == 5
+    assert nodes[0]["id"] == "1" and nodes[0]["parent"] is None
+    expanded = [n for n in nodes if n["depth"] == 2 and not n.get("truncated")]
+    truncated = [n for n in nodes if n.get("truncated")]
+    assert len(expanded) == 6 and len(truncated) == 9
+    assert expanded[0]["parent"] in {"1", "2", "3", "4", "5"}
+    batch_prompts = [c for _, c in fake_client.calls if '"items"' in c]
+    assert len(batch_prompts) == 3
+
+    # A second tree reuses every cached group and spends nothing on them
+    again = asyncio.run(collect(depth=2, budget=0))
+    assert again[-1]["data"]["calls"] == 0
+    assert not any(event["data"].get("truncated") for event in again if event["event"] == "node")
+
+
+def test_tree_budget_counts_retries_and_fallbacks(fake_client, monkeypatch):
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "broken-model,model-b")
+    original = fake_client.respond
+
+    def flaky(model, contents):
+        if model == "broken-model" and '"items"' in contents:
+            fake_client.calls.append((model, contents))
+            raise RuntimeError("upstream 500")
+        return original(model, contents)
+
+    monkeypatch.setattr(fake_client, "respond", flaky)
+
+    async def collect():
+        return [event async for event in services.stream_breakdown_tree_async("Launch MVP", "en", depth=3, budget=4)]
+
+    events = asyncio.run(collect())
+    done = events[-1]["data"]
+    # Guardrail, plan, then the first group's failed attempt and its fallback use up the budget
+    assert done["calls"] == len(fake_client.calls) == 4
+    assert len([event for event in events if event["event"] == "node" and not event["data"].get("truncated")]) == 5
+    assert done["truncated"] == 15
+
+
+def test_tree_does_not_expand_flagged_plans(fake_client, monkeypatch):
+    monkeypatch.setattr(guardrails, "LOCAL_GUARDRAIL", False)
+    original = fake_client.respond
+
+    def hostile(model, contents):
+        if "intake filter" in contents:
+            fake_client.calls.append((model, contents))
+            return SimpleNamespace(text=json.dumps({"status": "ABUSE", "reason": "hostile"}))
+        return original(model, contents)
+
+    monkeypatch.setattr(fake_client, "respond", hostile)
+
+    async def collect():
+        return [event async for event in services.stream_breakdown_tree_async("Ruin my rival", "en", depth=3)]
+
+    events = asyncio.run(collect())
+    assert [event["event"] for event in events] == ["plan", "done"]
+    assert events[0]["data"]["steps"][0].startswith("Channel secured")
+    assert events[-1]["data"]["calls"] == len(fake_client.calls) == 1
+    assert len(services._sub_breakdown_cache) == 0
+
+
+def test_combined_mode_answers_valid_goals_in_one_call(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "GUARDRAIL_MODE", "combined")
+    monkeypatch.setattr(guardrails, "LOCAL_GUARDRAIL", False)
+    first = asyncio.run(services.generate_breakdown_async("Launch MVP", "en"))
+    second = services.generate_breakdown("Launch MVP", "en")
+    assert first == second == {"steps": [f"Step {i}" for i in range(1, 6)], "complexity": 4}
+    assert len(fake_client.calls) == 1
+    assert "intake filter" not in fake_client.calls[0][1]
+
+
+def test_combined_mode_routes_flagged_goals_and_skips_cache(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "GUARDRAIL_MODE", "combined")
+    monkeypatch.setattr(guardrails, "LOCAL_GUARDRAIL", False)
+    flagged = asyncio.run(services.generate_breakdown_async("please flag me now", "en"))
+    assert flagged["steps"][0].startswith("Channel secured: hostile")
+    assert "status" not in flagged
+    assert not services._breakdown_cache.contains(services._cache_key("please flag me now", "en"))
+    # The verdict from the combined call answers the repeat without another upstream call
+    assert services.generate_breakdown("please flag me now", "en") == flagged
+    assert len(fake_client.calls) == 1
+
+
+def test_slow_upstream_returns_uncached_offline_plan_at_the_deadline(fake_client, monkeypatch):
+    original = fake_client.aio.models.generate_content
+
+    async def slow_plans(model, contents, config=None):
+        if "intake filter" not in contents:
+            await asyncio.sleep(5)
+        return await original(model, contents, config)
+
+    monkeypatch.setattr(fake_client.aio.models, "generate_content", slow_plans)
+    before = metrics.DEADLINE_FALLBACKS.value(kind="breakdown")
+
+    async def run():
+        with deadline.use_deadline(0.3):
+            return await services.generate_breakdown_async("Open a bakery", "en")
+
+    started = time.monotonic()
+    result = asyncio.run(asyncio.wait_for(run(), timeout=2))
+    assert time.monotonic() - started < 1.5
+    assert result["complexity"] == 0
+    assert len(services._breakdown_cache) == 0
+    assert metrics.DEADLINE_FALLBACKS.value(kind="breakdown") == before + 1
+
+
+def test_retry_is_skipped_when_backoff_outlasts_the_deadline(fake_client, monkeypatch):
+    monkeypatch.setattr(services, "BASE_RETRY_DELAY", 5.0)
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "only-model")
+
+    def throttled(model, contents):
+        fake_client.calls.append((model, contents))
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+    monkeypatch.setattr(fake_client, "respond", throttled)
+    started = time.monotonic()
+    with deadline.use_deadline(1.0):
+        result = services.generate_sub_breakdown("Hire a designer", "en")
+    assert time.monotonic() - started < 1.0
+    assert result == services._offline_substeps("en")
+    assert len(fake_client.calls) == 1
+    assert len(services._sub_breakdown_cache) == 0
+
+
+def _record_limits(fake_client, monkeypatch, respond):
+    limits = []
+
+    async def generate(model, contents, config=None):
+        limits.append(config.max_output_tokens)
+        fake_client.calls.append((model, contents))
+        return respond(model, contents, len(limits))
+
+    monkeypatch.setattr(fake_client.aio.models, "generate_content", generate)
+    return limits
+
+
+def test_output_budget_adapts_per_endpoint_and_language(fake_client, monkeypatch):
+    monkeypatch.setattr(budget, "MIN_SAMPLES", 3)
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "model-a")
+    usage = SimpleNamespace(prompt_token_count=90, candidates_token_count=100, thoughts_token_count=20, total_token_count=210)
+
+    def respond(model, contents, _):
+        return SimpleNamespace(text=json.dumps({"substeps": ["A", "B", "C"]}), usage_metadata=usage)
+
+    limits = _record_limits(fake_client, monkeypatch, respond)
+    before = metrics.TOKENS.value(endpoint="sub_breakdown", model="model-a", language="am", kind="thoughts")
+    for step in ("One", "Two", "Three", "Four"):
+        asyncio.run(services.generate_sub_breakdown_async(step, "am"))
+    assert limits == [services.MAX_OUTPUT_TOKENS] * 3 + [180]
+    assert metrics.TOKENS.value(endpoint="sub_breakdown", model="model-a", language="am", kind="thoughts") == before + 80
+    # English has its own history and still starts from the static limit
+    asyncio.run(services.generate_sub_breakdown_async("One", "en"))
+    assert limits[-1] == services.MAX_OUTPUT_TOKENS
+
+
+def test_truncated_answer_is_retried_once_with_a_larger_budget(fake_client, monkeypatch):
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "model-a")
+    cut_off = [SimpleNamespace(finish_reason=SimpleNamespace(value="MAX_TOKENS"))]
+
+    def respond(model, contents, call):
+        if call == 1:
+            return SimpleNamespace(text='{"substeps": ["A", "B', candidates=cut_off)
+        return SimpleNamespace(text=json.dumps({"substeps": ["A", "B", "C"]}))
+
+    limits = _record_limits(fake_client, monkeypatch, respond)
+    before = metrics.TRUNCATIONS.value(endpoint="sub_breakdown", model="model-a", language="en")
+    result = asyncio.run(services.generate_sub_breakdown_async("Write the spec", "en"))
+    assert result == {"substeps": ["A", "B", "C"]}
+    assert limits == [services.MAX_OUTPUT_TOKENS, services.MAX_OUTPUT_TOKENS * 2]
+    assert metrics.TRUNCATIONS.value(endpoint="sub_breakdown", model="model-a", language="en") == before + 1
@@ -0,0 +1,95 @@
+import io
+import json
+
+import pytest
+
+from app import services, snapshot
+from app.cache import CachedResult
+
+
+def _plan(first, complexity=3):
+    return {"steps": [first, "Two", "Three", "Four", "Five"], "complexity": complexity}
+
+
+@pytest.fixture
+def empty_caches(monkeypatch):
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "model-a")
+    services._breakdown_cache.clear()
+    services._sub_breakdown_cache.clear()
+    yield
+    services._breakdown_cache.clear()
+    services._sub_breakdown_cache.clear()
+
+
+def test_dump_and_load_round_trip_both_caches(empty_caches, tmp_path):
+    plan = _plan("ግብ አውጣ")
+    assert services.import_plan("Launch a bakery", plan, "en")
+    assert not services.import_plan("Open a bakery", {"steps": ["Only one step"], "complexity": 42}, "en")
+    services._sub_breakdown_cache.set(services._cache_key("Ship", "en"), {"substeps": ["A", "B", "C"]})
+    path = str(tmp_path / "cache.ndjson.gz")
+
+    assert snapshot.dump(path) == {"breakdown": 1, "sub_breakdown": 1}
+    services._breakdown_cache.clear()
+    services._sub_breakdown_cache.clear()
+    assert snapshot.load(path) == {"breakdown": 1, "sub_breakdown": 1, "skipped": 0}
+
+    restored = services._breakdown_cache.get(services._cache_key("launch a bakery!", "en"))
+    assert restored.body == CachedResult.of(plan).body
+    assert services.generate_sub_breakdown("Ship", "en") == {"substeps": ["A", "B", "C"]}
+
+
+def test_load_skips_entries_from_another_model_chain(empty_caches, tmp_path, monkeypatch):
+    services.import_plan("Launch a bakery", _plan("Bake", 2), "en")
+    path = str(tmp_path / "cache.ndjson.gz")
+    snapshot.dump(path)
+    services._breakdown_cache.clear()
+
+    monkeypatch.setenv("GEMINI_MODEL_CHAIN", "model-b")
+    assert snapshot.load(path) == {"breakdown": 0, "sub_breakdown": 0, "skipped": 1}
+    assert len(services._breakdown_cache) == 0
+
+
+def test_import_history_streams_and_keeps_the_newest_plans(empty_caches, monkeypatch):
+    monkeypatch.setattr(snapshot, "_CHUNK_CHARS", 16)
+    records = [
+        {"original": "Oldest goal", "steps": _plan("A")["steps"], "complexity": 2, "createdAt": "2024-01-01T00:00:00.000Z"},
+        {"original": "ሱቅ መክፈት", "steps": json.dumps(_plan("ሱቅ ፈልግ")["steps"], ensure_ascii=False), "complexity": 3, "createdAt": "2024-03-01T00:00:00.000Z"},
+        {"original": "Offline plan", "steps": _plan("Wait")["steps"], "complexity": 0, "createdAt": "2024-04-01T00:00:00.000Z"},
+        {"original": "Newest goal", "steps": _plan("B")["steps"], "complexity": 4, "createdAt": "2024-05-01T00:00:00.000Z"},
+        {"original": "Broken", "steps": "not json", "complexity": 2},
+        {"original": "Open a bakery", "steps": ["Only one step"], "complexity": 42},
+    ]
+    as_array = io.StringIO(json.dumps(records, ensure_ascii=False, indent=2))
+    counts = snapshot.import_history(as_array, limit=2)
+    assert counts == {"read": 6, "imported": 2, "skipped": 4}
+    assert services._breakdown_cache.get(services._cache_key("Newest goal", "en")) == _plan("B", 4)
+    assert services._breakdown_cache.get(services._cache_key("ሱቅ መክፈት", "am")) == _plan("ሱቅ ፈልግ")
+    assert services._breakdown_cache.get(services._cache_key("Oldest goal", "en")) is None
+    assert services._breakdown_cache.get(services._cache_key("Open a bakery", "en")) is None
+
+    services._breakdown_cache.clear()
+    as_ndjson = io.StringIO("\n".join(json.dumps(record, ensure_ascii=False) for record in records) + "\n")
+    assert snapshot.import_history(as_ndjson)["imported"] == 3
+
+
+def test_startup_restore_tolerates_missing_or_corrupt_snapshots(empty_caches, tmp_path, monkeypatch):
+    path = tmp_path / "cache.ndjson.gz"
+    monkeypatch.setattr(snapshot, "SNAPSHOT_PATH", str(path))
+    assert snapshot.restore_on_startup() is None
+    path.write_bytes(b"not gzip")
+    assert snapshot.restore_on_startup() is None
+
+    monkeypatch.setattr(snapshot, "SAVE_ON_SHUTDOWN", True)
+    services.import_plan("Launch a bakery", _plan("Bake", 2), "en")
+    assert snapshot.save_on_shutdown() == {"breakdown": 1, "sub_breakdown": 0}
+    services._breakdown_cache.clear()
+    assert snapshot.restore_on_startup()["breakdown"] == 1
+
+
+def test_cli_refuses_to_dump_an_in_memory_cache(empty_caches, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "CACHE_BACKEND", "memory")
+    path = tmp_path / "cache.ndjson.gz"
+    with pytest.raises(SystemExit) as exited:
+        snapshot.main_cli(["dump", str(path)])
+    assert "RESULT_CACHE_BACKEND=sqlite" in str(exited.value.code)
+    assert not path.exists()